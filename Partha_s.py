@@ -11,14 +11,17 @@ import plotly.express as px
 import time
 import json
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import chromadb
-from transformers import pipeline
-import spacy
-import torch
 import warnings
 import math
+import hashlib
+import importlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+import queue
+import sqlite3
+import uuid
+from array import array
 warnings.filterwarnings('ignore')
 
 # ======================================================
@@ -43,6 +46,24 @@ din7991_file_url = "https://docs.google.com/spreadsheets/d/1PjptIbFfebdF1h_Aj124
 asme_b18_3_local_path = r"G:\My Drive\Streamlite\ASME B18.3.xlsx"
 asme_b18_3_file_url = "https://docs.google.com/spreadsheets/d/1dPNGwf7bv5A77rMSPpl11dhcJTXQfob1/export?format=xlsx"
 
+# Persistent vector index for the AI assistant - lives next to the app and its data snapshot
+vector_index_path = os.environ.get(
+    "FASTENER_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastener_vector_index")
+)
+
+# Persistent answer cache for the AI assistant
+answer_cache_path = os.environ.get(
+    "FASTENER_ANSWER_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastener_answer_cache.sqlite3")
+)
+
+# Chat transcripts - kept out of session state, one row per message
+transcript_store_path = os.environ.get(
+    "FASTENER_TRANSCRIPT_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastener_transcripts.sqlite3")
+)
+
 # Thread files - UPDATED WITH GOOGLE SHEETS LINKS
 thread_files = {
     "ASME B1.1": "https://docs.google.com/spreadsheets/d/1YHgUloNsFudxxqhWQV66D2DtSSKWFP_w/export?format=xlsx",
@@ -146,6 +167,45 @@ def save_user_preferences():
             'theme_preference': 'light'
         }
 
+# ======================================================
+# CALCULATION HISTORY STORE
+# ======================================================
+HISTORY_MAX_ENTRIES = 20
+HISTORY_TEXT_FIELDS = ('product', 'series', 'size', 'diameter', 'length', 'material', 'timestamp')
+
+class CalculationHistory:
+    """Columnar calculation history - one typed column per field instead of one dict per calculation"""
+    
+    def __init__(self, max_entries=HISTORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.weight_kg = array('d')
+        self.text = {field: [] for field in HISTORY_TEXT_FIELDS}
+    
+    def __len__(self):
+        return len(self.weight_kg)
+    
+    def append(self, calculation_data):
+        self.weight_kg.append(float(calculation_data.get('weight_kg', math.nan)))
+        for field, column in self.text.items():
+            column.append(str(calculation_data.get(field, '')))
+        
+        if len(self.weight_kg) > self.max_entries:
+            overflow = len(self.weight_kg) - self.max_entries
+            del self.weight_kg[:overflow]
+            for column in self.text.values():
+                del column[:overflow]
+    
+    def record(self, index):
+        """Dict view of one entry - weight_lb derived from weight_kg"""
+        calc = {field: column[index] for field, column in self.text.items()}
+        calc['weight_kg'] = self.weight_kg[index]
+        calc['weight_lb'] = self.weight_kg[index] * 2.20462
+        return calc
+    
+    def recent(self, count=5):
+        """Newest entries first, as dicts"""
+        return [self.record(index) for index in range(len(self) - 1, max(len(self) - count, 0) - 1, -1)]
+
 def initialize_session_state():
     """Initialize all session state variables"""
     defaults = {
@@ -155,10 +215,10 @@ def initialize_session_state():
         "current_filters": {},
         "recent_searches": [],
         "favorite_products": [],
-        "calculation_history": [],
+        "calculation_history": CalculationHistory(),
         "export_format": "csv",
-        "chat_messages": [],
-        "ai_thinking": False,
+        "chat_session_id": uuid.uuid4().hex,
+        "chat_window_size": None,
         "ai_model_loaded": False,
         "multi_search_products": [],
         "current_filters_dimensional": {},
@@ -197,6 +257,8 @@ def initialize_session_state():
         "show_professional_card": False,
         "selected_product_details": None,
         "batch_calculation_results": pd.DataFrame(),
+        "batch_calculation_issues": None,
+        "batch_run_report": None,
         # Weight calculator session states - FIXED INITIALIZATION
         "weight_calc_product": "Select Product",
         "weight_calc_series": "Select Series",
@@ -1203,6 +1265,19 @@ if not df_iso4014.empty:
     if grade_col and grade_col != 'Product Grade':
         df_iso4014['Product Grade'] = df_iso4014[grade_col]
 
+def compute_catalog_version():
+    """Content fingerprint of all loaded catalog sheets - changes whenever any sheet changes"""
+    digest = hashlib.sha256()
+    for name, frame in [("main", df), ("iso4014", df_iso4014), ("din7991", df_din7991),
+                        ("asme_b18_3", df_asme_b18_3), ("mechem", df_mechem)]:
+        digest.update(name.encode())
+        if not frame.empty:
+            digest.update("|".join(map(str, frame.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(frame.astype(str), index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+catalog_version = compute_catalog_version()
+
 # ======================================================
 # ENHANCED MECHANICAL & CHEMICAL DATA PROCESSING - COMPLETELY FIXED
 # ======================================================
@@ -1260,80 +1335,19 @@ def process_mechanical_chemical_data():
         st.error(f"Error processing Mechanical & Chemical data: {str(e)}")
         return [], []
 
+COMMON_MECHEM_STANDARDS = ['ASTM A193', 'ASTM A320', 'ASTM A194', 'ISO 898-1', 'ISO 3506', 'ASME B18.2.1']
+
 def get_standards_for_property_class(property_class):
-    """Get available standards for a specific property class - COMPLETELY FIXED"""
+    """Get available standards for a specific property class - resolved through the ME&CERT row index"""
     if df_mechem.empty or not property_class or property_class == "All":
         return []
     
     try:
-        # Find ALL possible standard columns
-        standard_cols = []
-        possible_standard_cols = ['Standard', 'Specification', 'Norm', 'Type', 'Designation']
-        
-        for col in df_mechem.columns:
-            col_lower = str(col).lower()
-            for possible in possible_standard_cols:
-                if possible.lower() in col_lower:
-                    standard_cols.append(col)
-                    break
-        
-        # If no standard columns found, look for any column that might contain standard info
-        if not standard_cols:
-            for col in df_mechem.columns:
-                if any(word in col.lower() for word in ['iso', 'astm', 'asme', 'din', 'bs', 'jis', 'gb']):
-                    standard_cols.append(col)
-                    break
-        
-        # Find ALL possible property class columns
-        property_class_cols = []
-        possible_class_cols = ['Grade', 'Class', 'Property Class', 'Material Grade', 'Type', 'Designation', 'Material']
-        
-        for col in df_mechem.columns:
-            col_lower = str(col).lower()
-            for possible in possible_class_cols:
-                if possible.lower() in col_lower:
-                    property_class_cols.append(col)
-                    break
-        
-        # If no specific class columns found, use first few columns
-        if not property_class_cols:
-            for col in df_mechem.columns[:3]:
-                if df_mechem[col].dtype == 'object':
-                    property_class_cols.append(col)
-                    break
-        
-        # Try to find matching data using ALL property class columns
-        matching_standards = set()
-        
-        for prop_col in property_class_cols:
-            if prop_col in df_mechem.columns:
-                # Try exact match first
-                exact_match = df_mechem[df_mechem[prop_col] == property_class]
-                if not exact_match.empty:
-                    for std_col in standard_cols:
-                        if std_col in exact_match.columns:
-                            standards = exact_match[std_col].dropna().unique()
-                            for std in standards:
-                                if pd.notna(std) and str(std).strip() != '':
-                                    matching_standards.add(str(std).strip())
-                
-                # Try string contains match for more flexible matching
-                str_match = df_mechem[df_mechem[prop_col].astype(str).str.contains(str(property_class), na=False, case=False)]
-                if not str_match.empty:
-                    for std_col in standard_cols:
-                        if std_col in str_match.columns:
-                            standards = str_match[std_col].dropna().unique()
-                            for std in standards:
-                                if pd.notna(std) and str(std).strip() != '':
-                                    matching_standards.add(str(std).strip())
+        row_index = get_grade_knowledge(catalog_version)
+        matching_standards = row_index.standards_for(row_index.class_rows(property_class))
         
         # If still no standards found, return some default/common standards
-        if not matching_standards:
-            common_standards = ['ASTM A193', 'ASTM A320', 'ASTM A194', 'ISO 898-1', 'ISO 3506', 'ASME B18.2.1']
-            for std in common_standards:
-                matching_standards.add(std)
-        
-        return sorted(list(matching_standards))
+        return matching_standards or sorted(COMMON_MECHEM_STANDARDS)
         
     except Exception as e:
         st.error(f"Error getting standards for {property_class}: {str(e)}")
@@ -1345,36 +1359,13 @@ def show_mechanical_chemical_details(property_class):
         return
     
     try:
-        # Find ALL possible property class columns
-        property_class_cols = []
-        possible_class_cols = ['Grade', 'Class', 'Property Class', 'Material Grade', 'Type', 'Designation', 'Material']
-        
-        for col in df_mechem.columns:
-            col_lower = str(col).lower()
-            for possible in possible_class_cols:
-                if possible.lower() in col_lower:
-                    property_class_cols.append(col)
-                    break
-        
+        row_index = get_grade_knowledge(catalog_version)
+        property_class_cols = row_index.class_columns
         if not property_class_cols:
             st.info("No property class column found in the data")
             return
         
-        # Try to find matching data using ALL property class columns
-        filtered_data = pd.DataFrame()
-        
-        for prop_col in property_class_cols:
-            if prop_col in df_mechem.columns:
-                # Try exact match
-                exact_match = df_mechem[df_mechem[prop_col] == property_class]
-                if not exact_match.empty:
-                    filtered_data = exact_match
-                    break
-                # Try string contains
-                str_match = df_mechem[df_mechem[prop_col].astype(str).str.contains(str(property_class), na=False, case=False)]
-                if not str_match.empty:
-                    filtered_data = str_match
-                    break
+        filtered_data = df_mechem.iloc[row_index.class_rows(property_class)]
         
         if filtered_data.empty:
             st.info(f"No detailed data found for {property_class}")
@@ -1518,67 +1509,222 @@ def get_safe_size_options(temp_df):
     return size_options
 
 # ======================================================
-# UNIT CONVERSION FUNCTIONS - ENHANCED FOR INCH SERIES
+# UNIT CONVERSION FUNCTIONS - VECTORIZED UNIT REGISTRY
 # ======================================================
+# Millimetres per unit - every conversion is one factor lookup, so whole
+# arrays and result tables convert in a single vectorized multiply
+UNIT_REGISTRY_MM = {
+    'mm': 1.0,
+    'inch': 25.4,
+    'ft': 304.8,
+    'meter': 1000.0,
+}
+
+# Unit the dimensional sheets of each series are stored in
+SERIES_UNITS = {
+    'Inch': 'inch',
+    'Metric': 'mm',
+}
+
+def resolve_unit(from_unit, series=None):
+    """Effective unit of a value - Inch series values are always inches, unknown units are treated as mm"""
+    if series == "Inch":
+        return 'inch'
+    return from_unit if from_unit in UNIT_REGISTRY_MM else 'mm'
+
+def convert_units(values, from_unit, to_unit='mm', series=None):
+    """Convert a scalar, array or Series between registry units in one vectorized pass.
+    
+    from_unit and series may be single values or per-element arrays. Missing or
+    non-numeric values convert to 0.0, matching the scalar converters.
+    """
+    to_factor = UNIT_REGISTRY_MM.get(to_unit, 1.0)
+    
+    if np.ndim(from_unit) == 0 and np.ndim(series) == 0:
+        factor = UNIT_REGISTRY_MM[resolve_unit(from_unit, series)] / to_factor
+    else:
+        units = pd.Series(np.broadcast_to(np.asarray(from_unit, dtype=object), np.shape(values)).copy())
+        if np.ndim(series) == 0:
+            if series == "Inch":
+                units[:] = 'inch'
+        else:
+            units = units.where(np.asarray(series, dtype=object) != "Inch", 'inch')
+        factor = (units.map(UNIT_REGISTRY_MM).fillna(1.0) / to_factor).to_numpy()
+    
+    if np.ndim(values) == 0:
+        value = pd.to_numeric(values, errors='coerce')
+        return 0.0 if pd.isna(value) else float(value) * factor
+    
+    numeric = pd.to_numeric(pd.Series(values) if not isinstance(values, pd.Series) else values, errors='coerce')
+    converted = numeric.fillna(0.0).to_numpy(dtype=float) * factor
+    if isinstance(values, pd.Series):
+        return pd.Series(converted, index=values.index, name=values.name)
+    return converted
+
 def convert_to_mm(value, from_unit, series=None):
     """Convert any unit to millimeters - ENHANCED with series detection"""
-    try:
-        if pd.isna(value):
-            return 0.0
-        
-        value = float(value)
-        
-        # If series is specified as "Inch", assume the value is in inches and convert to mm
-        if series == "Inch":
-            return value * 25.4
-        
-        # Standard unit conversion
-        if from_unit == 'mm':
-            return value
-        elif from_unit == 'inch':
-            return value * 25.4
-        elif from_unit == 'ft':
-            return value * 304.8
-        elif from_unit == 'meter':
-            return value * 1000
-        else:
-            return value  # Assume mm if unknown unit
-    except Exception as e:
-        st.warning(f"Unit conversion error: {str(e)}")
-        return value
+    return convert_units(value, from_unit, 'mm', series)
 
 def convert_to_meters(value, from_unit, series=None):
     """Convert any unit to meters - ENHANCED with series detection"""
-    try:
-        if pd.isna(value):
-            return 0.0
-        
-        value = float(value)
-        
-        # If series is specified as "Inch", assume the value is in inches and convert to meters
-        if series == "Inch":
-            return value * 0.0254
+    return convert_units(value, from_unit, 'meter', series)
+
+def convert_dataframe_units(data_df, from_unit, to_unit):
+    """Convert every numeric dimension column of a result table in one vectorized pass"""
+    if data_df is None or data_df.empty or from_unit == to_unit:
+        return data_df
+    
+    numeric_cols = data_df.select_dtypes(include='number').columns
+    if len(numeric_cols) == 0:
+        return data_df
+    
+    factor = UNIT_REGISTRY_MM[resolve_unit(from_unit)] / UNIT_REGISTRY_MM[resolve_unit(to_unit)]
+    converted_df = data_df.copy()
+    converted_df[numeric_cols] = converted_df[numeric_cols] * factor
+    return converted_df
+
+# ======================================================
+# STRUCTURED CALCULATION ISSUES - NO UI CALLS IN THE COMPUTE PATH
+# ======================================================
+# Message templates per issue code, completed with the issue context when summarized
+ISSUE_MESSAGES = {
+    'MISSING_HEAD_DIMENSIONS': "missing head dimensions for {context} (standard cylinder formula used)",
+    'HEAD_LOOKUP_FAILED': "head dimension lookup failed for {context}",
+    'PITCH_DIAMETER_NOT_FOUND': "pitch diameter not found for {context}",
+    'PITCH_LOOKUP_FAILED': "pitch diameter lookup failed for {context}",
+    'INVALID_NUMBER': "non-numeric {context} treated as 0",
+    'CALCULATION_FAILED': "calculation failed: {context}",
+}
+
+class CalculationIssues:
+    """Columnar per-row error and warning log.
+    
+    The compute layer only records codes here; the UI summarizes the whole log
+    once instead of emitting one Streamlit message per problem.
+    """
+    def __init__(self):
+        self.rows = []
+        self.severities = []
+        self.codes = []
+        self.contexts = []
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    def add(self, code, severity='warning', row=None, context=''):
+        """Record one issue - row is the batch row position (None for single calculations)"""
+        self.rows.append(-1 if row is None else row)
+        self.severities.append(severity)
+        self.codes.append(code)
+        self.contexts.append(str(context))
+    
+    def has_errors(self):
+        return 'error' in self.severities
+    
+    def extend(self, other):
+        """Append every issue of another log"""
+        self.rows.extend(other.rows)
+        self.severities.extend(other.severities)
+        self.codes.extend(other.codes)
+        self.contexts.extend(other.contexts)
+    
+    def broadcast(self, group_codes, positions=None):
+        """Expand issues recorded per unique input group to every original row of that group.
+        
+        positions optionally maps each entry of group_codes to its row number in the full batch.
+        """
+        expanded = CalculationIssues()
+        if not self.codes:
+            return expanded
+        
+        group_codes = np.asarray(group_codes)
+        positions = np.arange(len(group_codes)) if positions is None else np.asarray(positions)
+        order = np.argsort(group_codes, kind='stable')
+        bounds = np.searchsorted(group_codes[order], np.asarray(self.rows), side='left')
+        ends = np.searchsorted(group_codes[order], np.asarray(self.rows), side='right')
+        for start, end, severity, code, context in zip(bounds, ends, self.severities, self.codes, self.contexts):
+            for row in order[start:end]:
+                expanded.add(code, severity, int(positions[row]), context)
+        return expanded
+    
+    def to_frame(self):
+        """Issues as a columnar DataFrame (row, severity, code, context)"""
+        return pd.DataFrame({
+            'row': np.asarray(self.rows, dtype=np.int64),
+            'severity': pd.Categorical(self.severities, categories=['error', 'warning']),
+            'code': pd.Categorical(self.codes),
+            'context': self.contexts,
+        })
+    
+    def summary(self):
+        """One line per (severity, code, context) with the number of affected rows"""
+        if not self.codes:
+            return pd.DataFrame(columns=['severity', 'code', 'context', 'rows', 'message'])
+        
+        issues_df = self.to_frame()
+        grouped = (
+            issues_df.groupby(['severity', 'code', 'context'], observed=True)['row']
+            .nunique()
+            .reset_index(name='rows')
+            .sort_values(['severity', 'rows'], ascending=[True, False])
+        )
+        grouped['message'] = [
+            ISSUE_MESSAGES.get(code, code).format(context=context)
+            for code, context in zip(grouped['code'], grouped['context'])
+        ]
+        return grouped.reset_index(drop=True)
+
+def show_calculation_issues(issues, batch=False, max_messages=10):
+    """Summarize a whole issue log with a bounded number of UI messages"""
+    if issues is None or len(issues) == 0:
+        return
+    
+    summary_df = issues.summary()
+    for _, issue in summary_df.head(max_messages).iterrows():
+        if batch:
+            row_label = "row" if issue['rows'] == 1 else "rows"
+            text = f"{issue['rows']} {row_label} {issue['message']}"
+        else:
+            text = issue['message'][0].upper() + issue['message'][1:]
         
-        # Standard unit conversion
-        if from_unit == 'mm':
-            return value / 1000
-        elif from_unit == 'inch':
-            return value * 0.0254
-        elif from_unit == 'ft':
-            return value * 0.3048
-        elif from_unit == 'meter':
-            return value
+        if issue['severity'] == 'error':
+            st.error(text)
         else:
-            return value / 1000  # Assume mm if unknown unit
-    except Exception as e:
-        st.warning(f"Unit conversion error: {str(e)}")
-        return value / 1000
+            st.warning(text)
+    
+    if len(summary_df) > max_messages:
+        with st.expander(f"{len(summary_df) - max_messages} more issue types"):
+            st.dataframe(summary_df.iloc[max_messages:], use_container_width=True)
 
 # ======================================================
 # ENHANCED WEIGHT CALCULATION FUNCTIONS FOR HEX PRODUCTS
 # ======================================================
 
-def get_hex_head_dimensions(standard, product, size):
+def find_head_dimension_columns(columns):
+    """Find the width across flats and head height columns of a dimensional sheet (Min preferred)"""
+    # Look for width across flats column
+    width_cols = [col for col in columns if any(keyword in col.lower() for keyword in ['width', 'across', 'flats', 'w_'])]
+    width_col = None
+    for col in width_cols:
+        if 'min' in col.lower():
+            width_col = col
+            break
+    if not width_col and width_cols:
+        width_col = width_cols[0]
+    
+    # Look for head height column
+    height_cols = [col for col in columns if any(keyword in col.lower() for keyword in ['head', 'height', 'head_height'])]
+    height_col = None
+    for col in height_cols:
+        if 'min' in col.lower():
+            height_col = col
+            break
+    if not height_col and height_cols:
+        height_col = height_cols[0]
+    
+    return width_col, height_col
+
+def get_hex_head_dimensions(standard, product, size, issues=None, row=None):
     """Get width across flats and head height for hex products from database"""
     try:
         # Get the appropriate dataframe based on standard
@@ -1598,31 +1744,13 @@ def get_hex_head_dimensions(standard, product, size):
             temp_df = temp_df[temp_df['Product'] == product]
         
         if 'Size' in temp_df.columns and size != "All":
-            # Normalize size comparison
-            temp_df = temp_df[temp_df['Size'].astype(str).str.strip() == str(size).strip()]
+            # Normalize size comparison (same normalization as the weight cache key)
+            temp_df = temp_df[temp_df['Size'].astype(str).map(normalize_size) == normalize_size(size)]
         
         if temp_df.empty:
             return None, None
         
-        # Look for width across flats column
-        width_cols = [col for col in temp_df.columns if any(keyword in col.lower() for keyword in ['width', 'across', 'flats', 'w_'])]
-        width_col = None
-        for col in width_cols:
-            if 'min' in col.lower():
-                width_col = col
-                break
-        if not width_col and width_cols:
-            width_col = width_cols[0]
-        
-        # Look for head height column
-        height_cols = [col for col in temp_df.columns if any(keyword in col.lower() for keyword in ['head', 'height', 'head_height'])]
-        height_col = None
-        for col in height_cols:
-            if 'min' in col.lower():
-                height_col = col
-                break
-        if not height_col and height_cols:
-            height_col = height_cols[0]
+        width_col, height_col = find_head_dimension_columns(temp_df.columns)
         
         width_across_flats = None
         head_height = None
@@ -1640,10 +1768,107 @@ def get_hex_head_dimensions(standard, product, size):
         return width_across_flats, head_height
         
     except Exception as e:
-        st.warning(f"Error getting hex head dimensions: {str(e)}")
+        if issues is not None:
+            issues.add('HEAD_LOOKUP_FAILED', 'warning', row, f"{standard} {size} ({str(e)})")
         return None, None
 
-def calculate_hex_product_weight(parameters, width_across_flats, head_height):
+# Products that use the hex head formula when head dimensions are available
+HEX_PRODUCTS = ["Hex Bolt", "Heavy Hex Bolt", "Hex Cap Screws", "Heavy Hex Screws"]
+
+# Product type factors for the standard cylinder formula
+PRODUCT_FACTORS = {
+    "Hex Bolt": 1.0,
+    "Heavy Hex Bolt": 1.1,
+    "Hex Cap Screws": 0.95,
+    "Heavy Hex Screws": 1.1,
+    "Hexagon Socket Head Cap Screws": 0.9,
+    "Hexagon Socket Countersunk Head Cap Screw": 0.85,
+    "Threaded Rod": 1.0  # Threaded rod uses full cylinder volume
+}
+
+def cylinder_volume(diameter_m, length_m):
+    """Cylinder volume in m³ - works on scalars and numpy arrays"""
+    return math.pi * (diameter_m / 2) ** 2 * length_m
+
+def hex_head_geometry(width_across_flats_m, head_height_m):
+    """Side length, hexagon area and head volume of a hex head - works on scalars and numpy arrays"""
+    # Side = (Width Across Flats / √3) × 2
+    side_length = (width_across_flats_m / math.sqrt(3)) * 2
+    # Area of regular hexagon = (3√3 × side²) / 2
+    hexagon_area = (3 * math.sqrt(3) * side_length**2) / 2
+    # Head volume = hexagon area × head height
+    return side_length, hexagon_area, hexagon_area * head_height_m
+
+# ======================================================
+# COMPACT WEIGHT RESULT RECORDS
+# ======================================================
+# Shared schema of every weight result - numeric fields are floats, NaN when not used by the method
+WEIGHT_RESULT_NUMERIC_FIELDS = ('weight_kg', 'diameter_m', 'length_m', 'volume_m3', 'density', 'product_factor',
+                                'shank_volume_m3', 'head_volume_m3', 'total_volume_m3', 'width_across_flats_m',
+                                'head_height_m', 'side_length_m', 'hexagon_area_m2')
+WEIGHT_RESULT_TEXT_FIELDS = ('series', 'original_diameter', 'original_length', 'calculation_method')
+WEIGHT_RESULT_FIELDS = WEIGHT_RESULT_NUMERIC_FIELDS + WEIGHT_RESULT_TEXT_FIELDS
+
+class WeightResult:
+    """Slotted weight result with a fixed schema - weight_g and weight_lb are derived on access.
+    
+    Supports result['weight_kg'] / result.get(...) like the old dict results; to_dict() gives the full dict view.
+    """
+    __slots__ = WEIGHT_RESULT_FIELDS
+    
+    def __init__(self, **values):
+        for field in WEIGHT_RESULT_NUMERIC_FIELDS:
+            value = values.pop(field, math.nan)
+            setattr(self, field, math.nan if value is None else float(value))
+        for field in WEIGHT_RESULT_TEXT_FIELDS:
+            setattr(self, field, str(values.pop(field, '')))
+        if values:
+            raise KeyError(f"Unknown weight result fields: {', '.join(values)}")
+    
+    @property
+    def weight_g(self):
+        return self.weight_kg * 1000
+    
+    @property
+    def weight_lb(self):
+        return self.weight_kg * 2.20462
+    
+    def __getitem__(self, key):
+        if key in ('weight_g', 'weight_lb') or key in WEIGHT_RESULT_FIELDS:
+            value = getattr(self, key)
+            if isinstance(value, float) and math.isnan(value):
+                raise KeyError(key)
+            return value
+        raise KeyError(key)
+    
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def __contains__(self, key):
+        return self.get(key) is not None
+    
+    def replace(self, **values):
+        """Copy with some fields changed"""
+        merged = {field: getattr(self, field) for field in WEIGHT_RESULT_FIELDS}
+        merged.update(values)
+        return WeightResult(**merged)
+    
+    def to_dict(self):
+        """Dict view with the fields used by the calculation method, plus weight_g / weight_lb"""
+        result = {'weight_kg': self.weight_kg, 'weight_g': self.weight_g, 'weight_lb': self.weight_lb}
+        for field in WEIGHT_RESULT_FIELDS:
+            value = getattr(self, field)
+            if not (isinstance(value, float) and math.isnan(value)):
+                result[field] = value
+        return result
+    
+    def __repr__(self):
+        return f"WeightResult(weight_kg={self.weight_kg:.6f}, calculation_method={self.calculation_method!r})"
+
+def calculate_hex_product_weight(parameters, width_across_flats, head_height, issues=None, row=None):
     """Calculate weight for hex products (Hex Bolt, Heavy Hex Bolt, Hex Cap Screws, Heavy Hex Screws)"""
     try:
         # Extract parameters
@@ -1657,23 +1882,8 @@ def calculate_hex_product_weight(parameters, width_across_flats, head_height):
         series = parameters.get('series', 'Metric')
         
         # Convert all dimensions to meters for calculation
-        if diameter_unit == 'mm':
-            diameter_m = convert_to_meters(diameter_value, 'mm', series)
-        elif diameter_unit == 'inch':
-            diameter_m = convert_to_meters(diameter_value, 'inch', series)
-        elif diameter_unit == 'ft':
-            diameter_m = convert_to_meters(diameter_value, 'ft', series)
-        else:  # meters
-            diameter_m = convert_to_meters(diameter_value, 'meter', series)
-        
-        if length_unit == 'mm':
-            length_m = convert_to_meters(length, 'mm', series)
-        elif length_unit == 'inch':
-            length_m = convert_to_meters(length, 'inch', series)
-        elif length_unit == 'ft':
-            length_m = convert_to_meters(length, 'ft', series)
-        else:  # meters
-            length_m = convert_to_meters(length, 'meter', series)
+        diameter_m = convert_to_meters(diameter_value, diameter_unit, series)
+        length_m = convert_to_meters(length, length_unit, series)
         
         # Convert head dimensions to meters
         if width_across_flats is not None:
@@ -1690,18 +1900,10 @@ def calculate_hex_product_weight(parameters, width_across_flats, head_height):
         density = get_material_density(material)  # kg/m³
         
         # 1. Calculate Shank Volume (Cylinder Volume)
-        shank_radius = diameter_m / 2
-        shank_volume = math.pi * shank_radius**2 * length_m  # m³
+        shank_volume = cylinder_volume(diameter_m, length_m)  # m³
         
         # 2. Calculate Head Volume (Hexagonal Prism)
-        # Calculate side length from width across flats: Side = (Width Across Flats / √3) × 2
-        side_length = (width_across_flats_m / math.sqrt(3)) * 2
-        
-        # Area of regular hexagon = (3√3 × side²) / 2
-        hexagon_area = (3 * math.sqrt(3) * side_length**2) / 2
-        
-        # Head volume = hexagon area × head height
-        head_volume = hexagon_area * head_height_m
+        side_length, hexagon_area, head_volume = hex_head_geometry(width_across_flats_m, head_height_m)
         
         # 3. Total Volume = Shank Volume + Head Volume
         total_volume = shank_volume + head_volume
@@ -1709,28 +1911,28 @@ def calculate_hex_product_weight(parameters, width_across_flats, head_height):
         # 4. Calculate Weight
         weight_kg = total_volume * density
         
-        return {
-            'weight_kg': weight_kg,
-            'weight_g': weight_kg * 1000,
-            'weight_lb': weight_kg * 2.20462,
-            'shank_volume_m3': shank_volume,
-            'head_volume_m3': head_volume,
-            'total_volume_m3': total_volume,
-            'diameter_m': diameter_m,
-            'length_m': length_m,
-            'width_across_flats_m': width_across_flats_m,
-            'head_height_m': head_height_m,
-            'side_length_m': side_length,
-            'hexagon_area_m2': hexagon_area,
-            'density': density,
-            'series': series,
-            'original_diameter': f"{diameter_value} {diameter_unit}",
-            'original_length': f"{length} {length_unit}",
-            'calculation_method': 'Hex Product Formula'
-        }
+        return WeightResult(
+            weight_kg=weight_kg,
+            shank_volume_m3=shank_volume,
+            head_volume_m3=head_volume,
+            total_volume_m3=total_volume,
+            volume_m3=total_volume,
+            diameter_m=diameter_m,
+            length_m=length_m,
+            width_across_flats_m=width_across_flats_m,
+            head_height_m=head_height_m,
+            side_length_m=side_length,
+            hexagon_area_m2=hexagon_area,
+            density=density,
+            series=series,
+            original_diameter=f"{diameter_value} {diameter_unit}",
+            original_length=f"{length} {length_unit}",
+            calculation_method='Hex Product Formula'
+        )
         
     except Exception as e:
-        st.error(f"Hex product calculation error: {str(e)}")
+        if issues is not None:
+            issues.add('CALCULATION_FAILED', 'error', row, f"hex product formula ({str(e)})")
         return None
 
 # ======================================================
@@ -1806,24 +2008,26 @@ def get_thread_standards_for_series(series):
         return ["ISO 965-2-98 Coarse", "ISO 965-2-98 Fine"]
     return ["Select Thread Standard"]
 
+# Material densities in kg/m³
+MATERIAL_DENSITIES = {
+    "Carbon Steel": 7850,
+    "Stainless Steel": 8000,
+    "Alloy Steel": 7850,
+    "Brass": 8500,
+    "Aluminum": 2700,
+    "Copper": 8960,
+    "Titanium": 4500,
+    "Bronze": 8800,
+    "Inconel": 8200,
+    "Monel": 8800,
+    "Nickel": 8900
+}
+
 def get_material_density(material):
     """Get density for different materials in kg/m³"""
-    density_map = {
-        "Carbon Steel": 7850,
-        "Stainless Steel": 8000,
-        "Alloy Steel": 7850,
-        "Brass": 8500,
-        "Aluminum": 2700,
-        "Copper": 8960,
-        "Titanium": 4500,
-        "Bronze": 8800,
-        "Inconel": 8200,
-        "Monel": 8800,
-        "Nickel": 8900
-    }
-    return density_map.get(material, 7850)  # Default to carbon steel
+    return MATERIAL_DENSITIES.get(material, 7850)  # Default to carbon steel
 
-def get_pitch_diameter_from_thread_data(thread_standard, thread_size, thread_class):
+def get_pitch_diameter_from_thread_data(thread_standard, thread_size, thread_class, issues=None, row=None):
     """Get pitch diameter from thread data for threaded rod calculation - ENHANCED FOR THREADED ROD"""
     try:
         df_thread = get_thread_data_enhanced(thread_standard, thread_size, thread_class)
@@ -1860,10 +2064,11 @@ def get_pitch_diameter_from_thread_data(thread_standard, thread_size, thread_cla
         return None
         
     except Exception as e:
-        st.warning(f"Could not retrieve pitch diameter: {str(e)}")
+        if issues is not None:
+            issues.add('PITCH_LOOKUP_FAILED', 'warning', row, f"{thread_standard} {thread_size} ({str(e)})")
         return None
 
-def calculate_weight_enhanced(parameters):
+def calculate_weight_enhanced(parameters, issues=None, row=None):
     """Enhanced weight calculation with proper material densities and geometry - UPDATED WITH HEX PRODUCT FORMULAS"""
     try:
         # Extract parameters
@@ -1879,81 +2084,510 @@ def calculate_weight_enhanced(parameters):
         size = parameters.get('size', 'All')
         
         # Check if this is a hex product that uses the special formula
-        hex_products = ["Hex Bolt", "Heavy Hex Bolt", "Hex Cap Screws", "Heavy Hex Screws"]
-        
-        if product_type in hex_products:
+        if product_type in HEX_PRODUCTS:
             # Get head dimensions from database
-            width_across_flats, head_height = get_hex_head_dimensions(standard, product_type, size)
+            width_across_flats, head_height = get_hex_head_dimensions(standard, product_type, size, issues, row)
             
             if width_across_flats is not None and head_height is not None:
                 # Use the specialized hex product calculation
-                return calculate_hex_product_weight(parameters, width_across_flats, head_height)
-            else:
-                st.warning(f"Could not retrieve head dimensions for {product_type}. Using standard calculation.")
+                return calculate_hex_product_weight(parameters, width_across_flats, head_height, issues, row)
+            elif issues is not None:
+                issues.add('MISSING_HEAD_DIMENSIONS', 'warning', row, f"{standard} {size}")
         
         # Standard calculation for other products
         # Convert all dimensions to meters for calculation, considering series
         # For Inch series, assume dimensions are in inches and convert to meters
-        if diameter_unit == 'mm':
-            diameter_m = convert_to_meters(diameter_value, 'mm', series)
-        elif diameter_unit == 'inch':
-            diameter_m = convert_to_meters(diameter_value, 'inch', series)
-        elif diameter_unit == 'ft':
-            diameter_m = convert_to_meters(diameter_value, 'ft', series)
-        else:  # meters
-            diameter_m = convert_to_meters(diameter_value, 'meter', series)
-        
-        if length_unit == 'mm':
-            length_m = convert_to_meters(length, 'mm', series)
-        elif length_unit == 'inch':
-            length_m = convert_to_meters(length, 'inch', series)
-        elif length_unit == 'ft':
-            length_m = convert_to_meters(length, 'ft', series)
-        else:  # meters
-            length_m = convert_to_meters(length, 'meter', series)
+        diameter_m = convert_to_meters(diameter_value, diameter_unit, series)
+        length_m = convert_to_meters(length, length_unit, series)
         
         # Get material density
         density = get_material_density(material)  # kg/m³
         
         # Calculate volume of cylinder (simplified calculation)
-        radius = diameter_m / 2
-        volume = math.pi * radius**2 * length_m  # m³
+        volume = cylinder_volume(diameter_m, length_m)  # m³
         
         # Calculate weight
         weight_kg = volume * density
         
         # Apply product type factor (simplified - in reality would use actual product geometry)
-        product_factors = {
-            "Hex Bolt": 1.0,
-            "Heavy Hex Bolt": 1.1,
-            "Hex Cap Screws": 0.95,
-            "Heavy Hex Screws": 1.1,
-            "Hexagon Socket Head Cap Screws": 0.9,
-            "Hexagon Socket Countersunk Head Cap Screw": 0.85,
-            "Threaded Rod": 1.0  # Threaded rod uses full cylinder volume
-        }
-        
-        factor = product_factors.get(product_type, 1.0)
+        factor = PRODUCT_FACTORS.get(product_type, 1.0)
         final_weight_kg = weight_kg * factor
         
-        return {
-            'weight_kg': final_weight_kg,
-            'weight_g': final_weight_kg * 1000,
-            'weight_lb': final_weight_kg * 2.20462,
-            'diameter_m': diameter_m,
-            'length_m': length_m,
-            'volume_m3': volume,
-            'density': density,
-            'product_factor': factor,
-            'series': series,
-            'original_diameter': f"{diameter_value} {diameter_unit}",
-            'original_length': f"{length} {length_unit}",
-            'calculation_method': 'Standard Cylinder Formula'
-        }
+        return WeightResult(
+            weight_kg=final_weight_kg,
+            diameter_m=diameter_m,
+            length_m=length_m,
+            volume_m3=volume,
+            density=density,
+            product_factor=factor,
+            series=series,
+            original_diameter=f"{diameter_value} {diameter_unit}",
+            original_length=f"{length} {length_unit}",
+            calculation_method='Standard Cylinder Formula'
+        )
         
     except Exception as e:
-        st.error(f"Calculation error: {str(e)}")
+        if issues is not None:
+            issues.add('CALCULATION_FAILED', 'error', row, str(e))
+        return None
+
+# ======================================================
+# PROCESS-WIDE WEIGHT RESULT CACHE
+# ======================================================
+WEIGHT_CACHE_MAX_ENTRIES = 4096
+
+class WeightResultCache:
+    """Bounded LRU cache of weight results shared by every session.
+    
+    Entries are keyed by canonical parameters and tagged with the catalog
+    version; a version change clears the cache on the next lookup.
+    """
+    def __init__(self, max_entries=WEIGHT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.catalog_version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _check_version(self, version):
+        if version != self.catalog_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.catalog_version = version
+    
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def put(self, key, version, entry):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            stats = {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'catalog_version': self.catalog_version,
+            }
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+@st.cache_resource(show_spinner=False)
+def get_weight_result_cache():
+    """Single weight result cache for the whole process"""
+    return WeightResultCache()
+
+def normalize_size(size):
+    """Canonical size text - case and spacing normalized so 'M10 X 1.5' == 'm10x1.5'"""
+    return re.sub(r'\s+', '', str(size)).upper()
+
+def canonical_weight_key(parameters):
+    """Cache key for a weight calculation - units normalized to mm, size normalized.
+    
+    Standard and size only change the result of hex products (head lookup),
+    so they are left out of the key for every other product.
+    """
+    product_type = str(parameters.get('product_type', 'Hex Bolt')).strip()
+    series = parameters.get('series', 'Metric')
+    diameter_mm = convert_to_mm(parameters.get('diameter_value', 0.0), parameters.get('diameter_unit', 'mm'), series)
+    length_mm = convert_to_mm(parameters.get('length', 0.0), parameters.get('length_unit', 'mm'), series)
+    
+    if product_type in HEX_PRODUCTS:
+        standard = str(parameters.get('standard', 'ASME B18.2.1')).strip()
+        size = normalize_size(parameters.get('size', 'All'))
+    else:
+        standard, size = '', ''
+    
+    return (product_type, standard, size, round(diameter_mm, 6), round(length_mm, 6),
+            str(parameters.get('material', 'Carbon Steel')).strip())
+
+def calculate_weight_cached(parameters, issues=None, row=None):
+    """calculate_weight_enhanced through the process-wide LRU cache - issue codes are replayed on hits"""
+    cache = get_weight_result_cache()
+    key = canonical_weight_key(parameters)
+    
+    cached = cache.get(key, catalog_version)
+    if cached is None:
+        row_issues = CalculationIssues()
+        result = calculate_weight_enhanced(parameters, row_issues, row)
+        recorded = list(zip(row_issues.severities, row_issues.codes, row_issues.contexts))
+        if result is not None and not row_issues.has_errors():
+            cache.put(key, catalog_version, (result, recorded))
+    else:
+        result, recorded = cached
+    
+    if issues is not None:
+        for severity, code, context in recorded:
+            issues.add(code, severity, row, context)
+    
+    if result is None:
+        return None
+    
+    # Echo the caller's own input units back in the result
+    return result.replace(
+        series=parameters.get('series', 'Metric'),
+        original_diameter=f"{parameters.get('diameter_value', 0.0)} {parameters.get('diameter_unit', 'mm')}",
+        original_length=f"{parameters.get('length', 0.0)} {parameters.get('length_unit', 'mm')}"
+    )
+
+# ======================================================
+# BATCH WEIGHT CALCULATION - ROW PARAMETERS AND ISSUE CODES
+# ======================================================
+BATCH_NUMERIC_COLUMNS = ['Blank_Diameter', 'Length']
+
+# Template columns that fully determine a row's result
+BATCH_INPUT_COLUMNS = ['Product_Type', 'Series', 'Standard', 'Size', 'Diameter_Type', 'Blank_Diameter',
+                       'Blank_Diameter_Unit', 'Thread_Standard', 'Thread_Size', 'Thread_Class',
+                       'Length', 'Length_Unit', 'Material']
+
+def _batch_text(row, column, default):
+    """Clean text cell from a batch row - blank, NaN and N/A cells fall back to default"""
+    value = row.get(column, default)
+    if pd.isna(value):
+        return default
+    value = str(value).strip()
+    return default if value == '' or value.upper() == 'N/A' else value
+
+def build_batch_parameters(row, row_number, issues):
+    """Map one batch template row to calculate_weight_enhanced parameters (None if it cannot be calculated)"""
+    series = _batch_text(row, 'Series', 'Metric')
+    diameter_type = _batch_text(row, 'Diameter_Type', 'Blank Diameter')
+    
+    parameters = {
+        'product_type': _batch_text(row, 'Product_Type', 'Hex Bolt'),
+        'diameter_type': diameter_type,
+        'material': _batch_text(row, 'Material', 'Carbon Steel'),
+        'length': row.get('Length', 0.0),
+        'length_unit': _batch_text(row, 'Length_Unit', 'mm'),
+        'series': series,
+        'standard': _batch_text(row, 'Standard', 'Not Required'),
+        'size': _batch_text(row, 'Size', 'All'),
+    }
+    
+    if diameter_type == "Pitch Diameter":
+        thread_standard = _batch_text(row, 'Thread_Standard', None)
+        thread_size = _batch_text(row, 'Thread_Size', None)
+        thread_class = _batch_text(row, 'Thread_Class', None)
+        
+        pitch_diameter = None
+        if thread_standard and thread_size:
+            pitch_diameter = get_pitch_diameter_from_thread_data(thread_standard, thread_size, thread_class, issues, row_number)
+        
+        if pitch_diameter is None:
+            issues.add('PITCH_DIAMETER_NOT_FOUND', 'error', row_number, f"{thread_standard} {thread_size}")
+            return None
+        
+        # ASME B1.1 data is in inches, ISO thread data is in mm
+        parameters['diameter_value'] = pitch_diameter
+        parameters['diameter_unit'] = 'inch' if series == "Inch" else 'mm'
+    else:
+        parameters['diameter_value'] = row.get('Blank_Diameter', 0.0)
+        parameters['diameter_unit'] = _batch_text(row, 'Blank_Diameter_Unit', 'mm')
+    
+    return parameters
+
+def batch_input_keys(data_df, normalize_numeric=False):
+    """Input columns of a batch with text cells normalized for comparison"""
+    key_cols = [col for col in BATCH_INPUT_COLUMNS if col in data_df.columns]
+    key_df = data_df[key_cols].reset_index(drop=True).copy()
+    for col in key_cols:
+        if normalize_numeric or col not in BATCH_NUMERIC_COLUMNS:
+            key_df[col] = key_df[col].astype(str).str.strip()
+    return key_df
+
+def factorize_batch_inputs(work_df):
+    """Group code per row - rows with identical input tuples share one code"""
+    key_df = batch_input_keys(work_df)
+    if key_df.columns.empty:
+        return np.arange(len(work_df))
+    return key_df.groupby(list(key_df.columns), sort=False, dropna=False).ngroup().to_numpy()
+
+def hash_batch_rows(data_df):
+    """Content hash per batch row over the input columns, stable across uploads"""
+    key_df = batch_input_keys(data_df, normalize_numeric=True)
+    if key_df.columns.empty:
+        return np.zeros(len(data_df), dtype='uint64')
+    return pd.util.hash_pandas_object(key_df, index=False).to_numpy()
+
+def match_previous_batch_rows(row_hashes, previous_run):
+    """Row number in the previous run for every unchanged row, -1 for new or changed rows"""
+    no_match = np.full(len(row_hashes), -1, dtype=np.int64)
+    if not previous_run or previous_run.get('catalog_version') != catalog_version:
+        return no_match
+    previous_results = previous_run.get('results')
+    if previous_results is None or previous_results.empty:
+        return no_match
+    
+    previous_hashes = pd.Series(np.arange(len(previous_results)), index=hash_batch_rows(previous_results))
+    previous_hashes = previous_hashes[~previous_hashes.index.duplicated()]
+    return previous_hashes.reindex(row_hashes).fillna(-1).to_numpy(dtype=np.int64)
+
+def calculate_weight_batch(batch_df, previous_run=None):
+    """Calculate weights for every batch row without any UI calls.
+    
+    Rows whose content hash matches a row of previous_run (same catalog
+    version) reuse its results. The remaining rows are factorized into
+    unique input tuples, each unique tuple is computed once and the
+    results are broadcast back to the original row order.
+    Returns (result_df, issues, run_report).
+    """
+    start_time = time.perf_counter()
+    issues = CalculationIssues()
+    work_df = batch_df.reset_index(drop=True).copy()
+    
+    # Unchanged rows from the previous upload are reused as-is
+    previous_rows = match_previous_batch_rows(hash_batch_rows(work_df), previous_run)
+    reused = previous_rows >= 0
+    compute_positions = np.flatnonzero(~reused)
+    
+    # Coerce numeric inputs column-wise and record unparseable cells once per row
+    for column in BATCH_NUMERIC_COLUMNS:
+        if column in work_df.columns:
+            numeric = pd.to_numeric(work_df[column], errors='coerce')
+            invalid_rows = np.flatnonzero(numeric.isna().to_numpy() & work_df[column].notna().to_numpy() & ~reused)
+            for row_number in invalid_rows:
+                issues.add('INVALID_NUMBER', 'warning', int(row_number), column)
+            work_df[column] = numeric.fillna(0.0)
+    
+    weights_kg = np.full(len(work_df), np.nan)
+    methods = np.full(len(work_df), '', dtype=object)
+    
+    if reused.any():
+        previous_results = previous_run['results']
+        weights_kg[reused] = previous_results['Weight_kg'].to_numpy()[previous_rows[reused]]
+        methods[reused] = previous_results['Calculation_Method'].to_numpy()[previous_rows[reused]]
+        
+        previous_issues = previous_run.get('issues')
+        if previous_issues is not None and len(previous_issues):
+            row_map = pd.DataFrame({'new_row': np.flatnonzero(reused), 'row': previous_rows[reused]})
+            carried = row_map.merge(previous_issues.to_frame(), on='row')
+            for new_row, severity, code, context in carried[['new_row', 'severity', 'code', 'context']].itertuples(index=False):
+                issues.add(code, severity, int(new_row), context)
+    
+    # Compute each unique input tuple once, indexed by group code
+    compute_df = work_df.iloc[compute_positions]
+    group_codes = factorize_batch_inputs(compute_df)
+    unique_groups, first_rows = np.unique(group_codes, return_index=True)
+    group_weights = np.full(len(unique_groups), np.nan)
+    group_methods = np.full(len(unique_groups), '', dtype=object)
+    group_issues = CalculationIssues()
+    
+    records = compute_df.iloc[first_rows].to_dict('records')
+    for group, row in zip(unique_groups, records):
+        parameters = build_batch_parameters(row, int(group), group_issues)
+        if parameters is None:
+            continue
+        result = calculate_weight_cached(parameters, group_issues, int(group))
+        if result:
+            group_weights[group] = result['weight_kg']
+            group_methods[group] = result.get('calculation_method', '')
+    
+    # Broadcast back to the original row order
+    weights_kg[compute_positions] = group_weights[group_codes]
+    methods[compute_positions] = group_methods[group_codes]
+    issues.extend(group_issues.broadcast(group_codes, compute_positions))
+    
+    result_df = batch_df.reset_index(drop=True).copy()
+    result_df['Weight_kg'] = weights_kg
+    result_df['Weight_g'] = weights_kg * 1000
+    result_df['Weight_lb'] = weights_kg * 2.20462
+    result_df['Calculation_Method'] = methods
+    
+    # Per-row status and issue codes in columnar form
+    issues_df = issues.to_frame()
+    issues_df = issues_df[issues_df['row'] >= 0]
+    status = np.full(len(result_df), 'OK', dtype=object)
+    issue_codes = np.full(len(result_df), '', dtype=object)
+    if not issues_df.empty:
+        issues_df = issues_df.astype({'code': str}).drop_duplicates(['row', 'code']).sort_values(['row', 'code'])
+        rows = issues_df['row'].to_numpy()
+        status[rows] = 'Warning'
+        status[rows[(issues_df['severity'] == 'error').to_numpy()]] = 'Error'
+        for row, code in zip(rows, issues_df['code'].to_numpy()):
+            issue_codes[row] = f"{issue_codes[row]};{code}" if issue_codes[row] else code
+    result_df['Status'] = status
+    result_df['Issue_Codes'] = issue_codes
+    
+    run_report = {
+        'rows': len(result_df),
+        'reused_rows': int(reused.sum()),
+        'recomputed_rows': len(compute_positions),
+        'unique_inputs': len(unique_groups),
+        'dedupe_ratio': len(compute_positions) / len(unique_groups) if len(unique_groups) else 1.0,
+        'elapsed_ms': (time.perf_counter() - start_time) * 1000,
+        'catalog_version': catalog_version,
+    }
+    
+    return result_df, issues, run_report
+
+# ======================================================
+# INVERSE WEIGHT SOLVER - CATALOG × STANDARD LENGTH GRID
+# ======================================================
+# Standard length grids in the series' own unit
+STANDARD_LENGTHS = {
+    'Inch': np.concatenate([np.arange(0.25, 6.0001, 0.25), np.arange(6.5, 12.0001, 0.5), np.arange(13.0, 24.0001, 1.0)]),
+    'Metric': np.array([2, 3, 4, 5, 6, 8, 10, 12, 16, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 80, 90,
+                        100, 110, 120, 130, 140, 150, 160, 180, 200, 220, 240, 260, 280, 300, 320, 340,
+                        360, 380, 400, 420, 440, 460, 480, 500], dtype=float),
+}
+
+def get_standard_dataframe(standard):
+    """Dimensional sheet for a standard (empty if not loaded)"""
+    standard_frames = {
+        "ASME B18.2.1": df,
+        "ISO 4014": df_iso4014,
+        "DIN-7991": df_din7991,
+        "ASME B18.3": df_asme_b18_3,
+    }
+    return standard_frames.get(standard, pd.DataFrame())
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def build_catalog_geometry(catalog_version):
+    """One row per (standard, product, size) with diameter and head dimensions in meters"""
+    frames = []
+    for standard, series in standard_series.items():
+        std_df = get_standard_dataframe(standard)
+        if std_df.empty or 'Product' not in std_df.columns or 'Size' not in std_df.columns:
+            continue
+        
+        std_df = std_df.dropna(subset=['Size']).copy()
+        std_df['Size'] = std_df['Size'].astype(str).str.strip()
+        std_df = std_df.drop_duplicates(subset=['Product', 'Size'], keep='first')
+        unit = SERIES_UNITS.get(series, 'mm')
+        
+        # Basic diameter: body/shank diameter (Max) when the sheet has it, otherwise the nominal size
+        body_cols = [col for col in std_df.columns
+                     if ('body dia' in col.lower() or 'unthreaded shank' in col.lower()) and 'max' in col.lower()]
+        nominal = std_df['Size'].map(size_to_float).astype(float)
+        if body_cols:
+            diameter = pd.to_numeric(std_df[body_cols[0]], errors='coerce').fillna(nominal)
+        else:
+            diameter = nominal
+        
+        width_col, height_col = find_head_dimension_columns(std_df.columns)
+        width = pd.to_numeric(std_df[width_col], errors='coerce') if width_col else pd.Series(np.nan, index=std_df.index)
+        height = pd.to_numeric(std_df[height_col], errors='coerce') if height_col else pd.Series(np.nan, index=std_df.index)
+        
+        frames.append(pd.DataFrame({
+            'Standard': standard,
+            'Product': std_df['Product'].astype(str).str.strip().to_numpy(),
+            'Size': std_df['Size'].to_numpy(),
+            'Series': series,
+            'diameter_m': convert_units(diameter.to_numpy(), unit, 'meter'),
+            'width_across_flats_m': width.to_numpy() * UNIT_REGISTRY_MM[unit] / 1000,
+            'head_height_m': height.to_numpy() * UNIT_REGISTRY_MM[unit] / 1000,
+        }))
+    
+    if not frames:
+        return pd.DataFrame()
+    
+    geometry = pd.concat(frames, ignore_index=True)
+    return geometry[geometry['diameter_m'] > 0].reset_index(drop=True)
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def build_weight_index(catalog_version):
+    """Sorted volume index over the whole catalog × standard length grid.
+    
+    Weight is volume × density, so one index sorted by volume serves every
+    material: a weight band becomes a volume band found with two binary searches.
+    """
+    geometry = build_catalog_geometry(catalog_version)
+    if geometry.empty:
+        return None
+    
+    entry_idx, lengths, lengths_m = [], [], []
+    for series, grid in STANDARD_LENGTHS.items():
+        entries = np.flatnonzero(geometry['Series'].to_numpy() == series)
+        if len(entries) == 0:
+            continue
+        entry_idx.append(np.repeat(entries, len(grid)))
+        lengths.append(np.tile(grid, len(entries)))
+        lengths_m.append(np.tile(convert_units(grid, SERIES_UNITS[series], 'meter'), len(entries)))
+    
+    entry_idx = np.concatenate(entry_idx)
+    lengths = np.concatenate(lengths)
+    lengths_m = np.concatenate(lengths_m)
+    
+    # Same formulas as calculate_weight_enhanced, evaluated over the whole grid at once
+    diameter_m = geometry['diameter_m'].to_numpy()[entry_idx]
+    width_m = geometry['width_across_flats_m'].to_numpy()[entry_idx]
+    height_m = geometry['head_height_m'].to_numpy()[entry_idx]
+    products = geometry['Product'].to_numpy()[entry_idx]
+    
+    uses_hex = np.isin(products, HEX_PRODUCTS) & ~np.isnan(width_m) & ~np.isnan(height_m)
+    factors = pd.Series(products).map(PRODUCT_FACTORS).fillna(1.0).to_numpy()
+    shank = cylinder_volume(diameter_m, lengths_m)
+    head = hex_head_geometry(np.nan_to_num(width_m), np.nan_to_num(height_m))[2]
+    volume = np.where(uses_hex, shank + head, shank * factors)
+    
+    order = np.argsort(volume, kind='stable')
+    return {
+        'geometry': geometry,
+        'volume': volume[order],
+        'entry_idx': entry_idx[order],
+        'length': lengths[order],
+        'uses_hex': uses_hex[order],
+    }
+
+def find_catalog_weight_matches(min_kg, max_kg, material, standard="All", product="All"):
+    """All (standard, product, size, length) candidates whose weight falls inside [min_kg, max_kg]"""
+    index = build_weight_index(catalog_version)
+    if index is None or max_kg < min_kg:
+        return pd.DataFrame(), 0
+    
+    density = get_material_density(material)
+    lo = np.searchsorted(index['volume'], min_kg / density, side='left')
+    hi = np.searchsorted(index['volume'], max_kg / density, side='right')
+    
+    geometry = index['geometry']
+    entries = index['entry_idx'][lo:hi]
+    matches = pd.DataFrame({
+        'Standard': geometry['Standard'].to_numpy()[entries],
+        'Product': geometry['Product'].to_numpy()[entries],
+        'Size': geometry['Size'].to_numpy()[entries],
+        'Length': index['length'][lo:hi],
+        'Length_Unit': np.where(geometry['Series'].to_numpy()[entries] == "Inch", 'inch', 'mm'),
+        'Weight_kg': index['volume'][lo:hi] * density,
+        'Calculation_Method': np.where(index['uses_hex'][lo:hi], 'Hex Product Formula', 'Standard Cylinder Formula'),
+    })
+    
+    if standard != "All":
+        matches = matches[matches['Standard'] == standard]
+    if product != "All":
+        matches = matches[matches['Product'] == product]
+    
+    return matches.reset_index(drop=True), len(index['volume'])
+
+def solve_threaded_rod_length(diameter_value, diameter_unit, series, material, target_kg):
+    """Length of threaded rod (in mm) that weighs target_kg - inverse of the cylinder formula"""
+    diameter_m = convert_to_meters(diameter_value, diameter_unit, series)
+    mass_per_meter = cylinder_volume(diameter_m, 1.0) * get_material_density(material) * PRODUCT_FACTORS["Threaded Rod"]
+    if mass_per_meter <= 0:
         return None
+    return target_kg / mass_per_meter * 1000
 
 def show_weight_calculator_enhanced():
     """Enhanced weight calculator with complete product standards workflow"""
@@ -2232,6 +2866,8 @@ def show_weight_calculator_enhanced():
                 'size': selected_size
             }
             
+            calculation_issues = CalculationIssues()
+            
             # Add diameter parameters based on type
             if selected_diameter_type == "Blank Diameter":
                 calculation_params.update({
@@ -2241,7 +2877,7 @@ def show_weight_calculator_enhanced():
             else:
                 # For pitch diameter, get the actual diameter from thread data
                 if selected_product == "Threaded Rod" and thread_size != "All":
-                    pitch_diameter = get_pitch_diameter_from_thread_data(thread_standard, thread_size, thread_class)
+                    pitch_diameter = get_pitch_diameter_from_thread_data(thread_standard, thread_size, thread_class, calculation_issues)
                     if pitch_diameter:
                         # For Inch series, pitch diameter from ASME B1.1 is in inches
                         if selected_series == "Inch":
@@ -2258,6 +2894,7 @@ def show_weight_calculator_enhanced():
                             })
                             st.success(f"Using Pitch Diameter (Min): {pitch_diameter:.4f} mm for Threaded Rod")
                     else:
+                        show_calculation_issues(calculation_issues)
                         st.error("Could not retrieve pitch diameter from thread data")
                         return
                 else:
@@ -2268,7 +2905,8 @@ def show_weight_calculator_enhanced():
                     })
             
             # Perform calculation
-            result = calculate_weight_enhanced(calculation_params)
+            result = calculate_weight_cached(calculation_params, calculation_issues)
+            show_calculation_issues(calculation_issues)
             
             if result:
                 st.session_state.weight_calc_result = result
@@ -2282,9 +2920,7 @@ def show_weight_calculator_enhanced():
                     'diameter': f"{blank_diameter if selected_diameter_type == 'Blank Diameter' else thread_size} {blank_dia_unit if selected_diameter_type == 'Blank Diameter' else 'mm'}",
                     'length': f"{length} {length_unit}",
                     'material': material,
-                    'weight_kg': result['weight_kg'],
-                    'weight_lb': result['weight_lb'],
-                    'timestamp': datetime.now().isoformat()
+                    'weight_kg': result['weight_kg']
                 }
                 save_calculation_history(calculation_data)
                 
@@ -2444,11 +3080,140 @@ def show_batch_calculator_enhanced():
                 st.error(f"Missing required columns: {missing_cols}")
             else:
                 if st.button("Process Batch Calculation", use_container_width=True, key="process_batch_enhanced"):
-                    st.info("Batch processing with enhanced workflow ready for implementation")
-                    st.write(f"Records to process: {len(batch_df)}")
+                    previous_run = None
+                    if st.session_state.batch_calculation_results is not None and st.session_state.batch_run_report:
+                        previous_run = {
+                            'results': st.session_state.batch_calculation_results,
+                            'issues': st.session_state.batch_calculation_issues,
+                            'catalog_version': st.session_state.batch_run_report.get('catalog_version'),
+                        }
+                    with st.spinner(f"Processing {len(batch_df)} records..."):
+                        batch_results, batch_issues, run_report = calculate_weight_batch(batch_df, previous_run)
+                    st.session_state.batch_calculation_results = batch_results
+                    st.session_state.batch_calculation_issues = batch_issues
+                    st.session_state.batch_run_report = run_report
                     
         except Exception as e:
             st.error(f"Error reading file: {str(e)}")
+    
+    # Show batch results with a single summary of all row issues
+    batch_results = st.session_state.batch_calculation_results
+    if not batch_results.empty:
+        st.markdown("### Batch Results")
+        
+        status_counts = batch_results['Status'].value_counts()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Rows", len(batch_results))
+        with col2:
+            st.metric("OK", int(status_counts.get('OK', 0)))
+        with col3:
+            st.metric("Warnings", int(status_counts.get('Warning', 0)))
+        with col4:
+            st.metric("Errors", int(status_counts.get('Error', 0)))
+        
+        run_report = st.session_state.get('batch_run_report')
+        if run_report:
+            st.caption(
+                f"Run report: {run_report['rows']} rows, {run_report['reused_rows']} reused from the previous upload, "
+                f"{run_report['recomputed_rows']} recomputed as {run_report['unique_inputs']} unique inputs "
+                f"(dedupe ratio {run_report['dedupe_ratio']:.1f}×) in {run_report['elapsed_ms']:.0f} ms"
+            )
+        
+        show_calculation_issues(st.session_state.get('batch_calculation_issues'), batch=True)
+        
+        st.dataframe(batch_results, use_container_width=True, height=400)
+        st.download_button(
+            label="Download Batch Results (CSV)",
+            data=batch_results.to_csv(index=False),
+            file_name=f"batch_weight_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+
+def show_inverse_solver():
+    """Inverse mode - find catalog bolts or threaded rod lengths that hit a target weight"""
+    
+    st.markdown("### Inverse Weight Solver")
+    
+    st.info("""
+    **Find what hits a target weight**
+    Search the whole catalog × standard length grid for bolts in a weight band,
+    or solve the threaded rod length that weighs a given amount.
+    """)
+    
+    solver_mode = st.radio(
+        "Solver Mode",
+        ["Catalog Weight Band", "Threaded Rod Length"],
+        horizontal=True,
+        key="inverse_solver_mode"
+    )
+    
+    if solver_mode == "Catalog Weight Band":
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            material = st.selectbox("Material", list(MATERIAL_DENSITIES.keys()), key="inverse_material")
+            min_kg = st.number_input("Minimum Weight (kg)", min_value=0.0, value=0.05, step=0.01, format="%.4f", key="inverse_min_kg")
+        with col2:
+            standard_options = ["All"] + sorted(st.session_state.available_series.keys())
+            standard = st.selectbox("Standard", standard_options, key="inverse_standard")
+            max_kg = st.number_input("Maximum Weight (kg)", min_value=0.0, value=0.10, step=0.01, format="%.4f", key="inverse_max_kg")
+        with col3:
+            product_options = ["All"]
+            if standard != "All":
+                product_options += [p for p in get_products_for_standard(standard) if p not in ("All", "Threaded Rod")]
+            product = st.selectbox("Product", product_options, key="inverse_product")
+        
+        if st.button("Find Matching Bolts", use_container_width=True, type="primary", key="inverse_find"):
+            start_time = time.perf_counter()
+            matches, grid_size = find_catalog_weight_matches(min_kg, max_kg, material, standard, product)
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            
+            if matches.empty:
+                st.warning(f"No catalog bolts in {material} between {min_kg} kg and {max_kg} kg")
+            else:
+                st.success(f"Found {len(matches)} candidates")
+                st.dataframe(matches, use_container_width=True, height=400)
+            st.caption(f"Searched {grid_size} catalog × length combinations in {elapsed_ms:.1f} ms")
+    
+    else:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            thread_standard = st.selectbox("Thread Standard", list(thread_files.keys()), key="inverse_thread_standard")
+            thread_size = st.selectbox("Thread Size", get_thread_sizes_enhanced(thread_standard), key="inverse_thread_size")
+        with col2:
+            if thread_standard == "ASME B1.1":
+                thread_class_options = get_thread_classes_enhanced(thread_standard)
+                if len(thread_class_options) == 1:  # Only "All"
+                    thread_class_options = ["2A", "3A", "1A"]
+                thread_class = st.selectbox("Tolerance Class", thread_class_options, key="inverse_thread_class")
+            else:
+                thread_class = "N/A"
+                st.caption("Tolerance Class: Not applicable for metric threads")
+            material = st.selectbox("Material", list(MATERIAL_DENSITIES.keys()), key="inverse_rod_material")
+        with col3:
+            target_kg = st.number_input("Target Weight (kg)", min_value=0.001, value=2.0, step=0.1, key="inverse_target_kg")
+        
+        if st.button("Solve Rod Length", use_container_width=True, type="primary", key="inverse_solve_rod"):
+            series = "Inch" if thread_standard == "ASME B1.1" else "Metric"
+            issues = CalculationIssues()
+            pitch_diameter = None
+            if thread_size != "All":
+                pitch_diameter = get_pitch_diameter_from_thread_data(thread_standard, thread_size, thread_class, issues)
+            
+            if pitch_diameter is None:
+                show_calculation_issues(issues)
+                st.error("Select a thread size with pitch diameter data")
+            else:
+                length_mm = solve_threaded_rod_length(pitch_diameter, SERIES_UNITS[series], series, material, target_kg)
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Length (mm)", f"{length_mm:.1f}")
+                with col2:
+                    st.metric("Length (inch)", f"{length_mm / UNIT_REGISTRY_MM['inch']:.2f}")
+                with col3:
+                    st.metric("Length (ft)", f"{length_mm / UNIT_REGISTRY_MM['ft']:.3f}")
+                st.caption(f"Pitch Diameter (Min): {pitch_diameter:.4f} {'in' if series == 'Inch' else 'mm'} | Density: {get_material_density(material)} kg/m³")
 
 # ======================================================
 # ENHANCED CALCULATIONS PAGE - UPDATED WITH NEW WORKFLOW
@@ -2456,7 +3221,7 @@ def show_batch_calculator_enhanced():
 def show_enhanced_calculations():
     """Enhanced calculations page with complete product standards workflow"""
     
-    tab1, tab2, tab3 = st.tabs(["Single Calculator", "Batch Processor", "Analytics"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Single Calculator", "Batch Processor", "Inverse Solver", "Analytics"])
     
     with tab1:
         show_weight_calculator_enhanced()
@@ -2465,9 +3230,26 @@ def show_enhanced_calculations():
         show_batch_calculator_enhanced()
     
     with tab3:
+        show_inverse_solver()
+    
+    with tab4:
         st.markdown("### Calculation Analytics - ENHANCED")
         st.info("Analytics dashboard will show calculation history and trends after weight calculations are implemented.")
         
+        # Process-wide weight result cache counters
+        cache_stats = get_weight_result_cache().stats()
+        st.markdown("#### Weight Result Cache")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Cached Results", f"{cache_stats['entries']} / {cache_stats['max_entries']}")
+        with col2:
+            st.metric("Hits", cache_stats['hits'])
+        with col3:
+            st.metric("Misses", cache_stats['misses'])
+        with col4:
+            st.metric("Hit Rate", f"{cache_stats['hit_rate']:.1%}")
+        st.caption(f"Catalog version: {cache_stats['catalog_version'] or catalog_version} | Invalidations: {cache_stats['invalidations']}")
+        
         if 'calculation_history' in st.session_state and st.session_state.calculation_history:
             st.write("Calculation history will be displayed here")
         else:
@@ -2476,35 +3258,1485 @@ def show_enhanced_calculations():
 # ======================================================
 # ADVANCED AI ASSISTANT WITH SELF-LEARNING CAPABILITIES
 # ======================================================
-class AdvancedFastenerAI:
-    def __init__(self, df, df_iso4014, df_mechem, thread_files, df_din7991=None, df_asme_b18_3=None):
-        self.df = df
-        self.df_iso4014 = df_iso4014
-        self.df_mechem = df_mechem
-        self.df_din7991 = df_din7991
-        self.df_asme_b18_3 = df_asme_b18_3
-        self.thread_files = thread_files
-        
-        try:
-            self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
-            self.qa_pipeline = pipeline("question-answering", 
-                                      model="distilbert-base-cased-distilled-squad")
-            st.session_state.ai_model_loaded = True
-        except Exception as e:
-            st.warning(f"AI models loading issue: {str(e)}")
-            st.session_state.ai_model_loaded = False
-        
-        try:
-            self.chroma_client = chromadb.Client()
-            self.collection = self.chroma_client.create_collection(name="fastener_knowledge")
-        except:
-            self.collection = None
+# Vector index ingest batch sizes
+INDEX_ENCODE_BATCH_SIZE = 256
+INDEX_ADD_BATCH_SIZE = 2000
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_MODEL_HUB_ID = f"sentence-transformers/{EMBEDDING_MODEL_NAME}"
+
+QA_MODEL_NAME = "distilbert-base-cased-distilled-squad"
+
+# ML libraries used only by the AI assistant - imported on first use, never at app startup
+ML_STACK_IMPORTS = ["torch", "sentence_transformers", "transformers", "chromadb", "onnxruntime"]
+
+@st.cache_resource(show_spinner="Loading AI libraries...")
+def load_ml_stack():
+    """Import the assistant's ML libraries once per process.
+    
+    Returns {'modules': name -> module, 'report': per-library import time and error}.
+    Libraries that fail to import are left out of modules.
+    """
+    modules, report = {}, []
+    for module_name in ML_STACK_IMPORTS:
+        start_time = time.perf_counter()
+        try:
+            modules[module_name] = importlib.import_module(module_name)
+            error = None
+        except Exception as e:
+            error = str(e)
+        report.append({
+            'library': module_name,
+            'loaded': error is None,
+            'import_ms': (time.perf_counter() - start_time) * 1000,
+            'error': error,
+        })
+    return {'modules': modules, 'report': report}
+
+def get_ml_module(name):
+    """One lazily imported ML library (see ML_STACK_IMPORTS) - raises ImportError if it is unavailable"""
+    modules = load_ml_stack()['modules']
+    if name not in modules:
+        raise ImportError(f"{name} is not installed")
+    return modules[name]
+INDEX_COLLECTION_PREFIX = "fastener_knowledge"
+
+def hash_index_documents(ids, documents, embedding_id=EMBEDDING_MODEL_NAME):
+    """Content hash of the indexed rows - includes the embedding model so a model change also rebuilds"""
+    digest = hashlib.sha256(embedding_id.encode('utf-8'))
+    for doc_id, document in zip(ids, documents):
+        digest.update(doc_id.encode('utf-8'))
+        digest.update(b'\x1e')
+        digest.update(document.encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+def open_vector_client():
+    """Persistent Chroma client under vector_index_path, in-memory client if the directory is unusable"""
+    try:
+        os.makedirs(vector_index_path, exist_ok=True)
+        return get_ml_module('chromadb').PersistentClient(path=vector_index_path), True
+    except ImportError:
+        raise
+    except Exception:
+        return get_ml_module('chromadb').Client(), False
+
+def build_row_texts(data_df):
+    """Space-joined text of every row's non-empty cells - one pass over the object array instead of iterrows"""
+    values = data_df.to_numpy(dtype=object)
+    present = data_df.notna().to_numpy()
+    row_texts = [" ".join([str(val) for val, keep in zip(row, keep_row) if keep])
+                 for row, keep_row in zip(values, present)]
+    return pd.Series(row_texts, index=data_df.index, dtype=object)
+
+# ======================================================
+# ONNX RUNTIME CPU BACKEND FOR THE ASSISTANT MODELS
+# ======================================================
+# torch (default), onnx (fp32) or onnx-int8 (dynamically quantized weights)
+AI_BACKENDS = ["torch", "onnx", "onnx-int8"]
+AI_BACKEND = os.environ.get("FASTENER_AI_BACKEND", "torch")
+onnx_model_path = os.environ.get(
+    "FASTENER_ONNX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastener_onnx_models")
+)
+ONNX_MAX_SEQUENCE_LENGTH = 384
+# Intra-op threads for model inference - one inference worker uses them, so sessions do not oversubscribe the CPU
+INFERENCE_THREADS = int(os.environ.get("FASTENER_INFERENCE_THREADS", str(max(1, (os.cpu_count() or 2) // 2))))
+QA_MAX_ANSWER_TOKENS = 15
+
+def export_onnx_model(kind, quantized=False):
+    """Export the embedding ('embedder') or QA ('qa') model to ONNX once - returns the .onnx path"""
+    model_dir = os.path.join(onnx_model_path, kind)
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+    target_path = int8_path if quantized else fp32_path
+    if os.path.exists(target_path):
+        return target_path
+    
+    os.makedirs(model_dir, exist_ok=True)
+    torch = get_ml_module('torch')
+    transformers = get_ml_module('transformers')
+    hub_name = EMBEDDING_MODEL_HUB_ID if kind == "embedder" else QA_MODEL_NAME
+    tokenizer = transformers.AutoTokenizer.from_pretrained(hub_name)
+    tokenizer.save_pretrained(model_dir)
+    
+    if not os.path.exists(fp32_path):
+        if kind == "embedder":
+            model = transformers.AutoModel.from_pretrained(hub_name)
+            output_names = ["last_hidden_state"]
+        else:
+            model = transformers.AutoModelForQuestionAnswering.from_pretrained(hub_name)
+            output_names = ["start_logits", "end_logits"]
+        model.eval()
+        
+        sample = tokenizer(["fastener grade"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + output_names}
+        with torch.no_grad():
+            torch.onnx.export(model, (), fp32_path, kwargs={name: sample[name] for name in input_names},
+                              input_names=input_names, output_names=output_names,
+                              dynamic_axes=dynamic_axes, opset_version=17, dynamo=False)
+    
+    if quantized:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return target_path
+
+def _onnx_session(model_file):
+    onnxruntime = get_ml_module('onnxruntime')
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = INFERENCE_THREADS
+    return onnxruntime.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+
+def _onnx_inputs(session, encoded):
+    """Feed only the tokenizer outputs the exported graph declares"""
+    return {item.name: encoded[item.name].astype(np.int64) for item in session.get_inputs()}
+
+class OnnxSentenceEmbedder:
+    """ONNX Runtime replacement for SentenceTransformer.encode - mean pooling + L2 normalization like all-MiniLM-L6-v2"""
+    
+    def __init__(self, quantized=False):
+        model_file = export_onnx_model("embedder", quantized)
+        self.tokenizer = get_ml_module('transformers').AutoTokenizer.from_pretrained(os.path.dirname(model_file))
+        self.session = _onnx_session(model_file)
+    
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            encoded = self.tokenizer(sentences[start:start + batch_size], padding=True, truncation=True,
+                                     max_length=256, return_tensors="np")
+            hidden = self.session.run(None, _onnx_inputs(self.session, encoded))[0]
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None))
+        embeddings = np.vstack(batches) if batches else np.zeros((0, 384), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+class OnnxQuestionAnswerer:
+    """ONNX Runtime replacement for the question-answering pipeline - same call style and answer dict"""
+    
+    def __init__(self, quantized=False):
+        model_file = export_onnx_model("qa", quantized)
+        self.tokenizer = get_ml_module('transformers').AutoTokenizer.from_pretrained(os.path.dirname(model_file))
+        self.session = _onnx_session(model_file)
+    
+    def __call__(self, question, context, **kwargs):
+        """Answer dict for one question, or a list of them for lists of questions and contexts (one padded forward pass)"""
+        single = not isinstance(question, list)
+        questions, contexts = ([question], [context]) if single else (list(question), list(context))
+        encoded = self.tokenizer(questions, contexts, truncation="only_second", max_length=ONNX_MAX_SEQUENCE_LENGTH,
+                                 padding=True, return_offsets_mapping=True, return_tensors="np")
+        offsets = encoded.pop("offset_mapping")
+        start_logits, end_logits = self.session.run(None, _onnx_inputs(self.session, encoded))
+        
+        answers = []
+        for row, context_text in enumerate(contexts):
+            # Only context tokens can start or end an answer
+            context_mask = np.array([sequence_id == 1 for sequence_id in encoded.sequence_ids(row)])
+            start_probs = _masked_softmax(start_logits[row], context_mask)
+            end_probs = _masked_softmax(end_logits[row], context_mask)
+            
+            # Best span with start <= end <= start + QA_MAX_ANSWER_TOKENS
+            scores = np.triu(np.outer(start_probs, end_probs))
+            scores = np.tril(scores, QA_MAX_ANSWER_TOKENS - 1)
+            start_token, end_token = np.unravel_index(np.argmax(scores), scores.shape)
+            start_char, end_char = int(offsets[row][start_token][0]), int(offsets[row][end_token][1])
+            answers.append({'score': float(scores[start_token, end_token]), 'start': start_char, 'end': end_char,
+                            'answer': context_text[start_char:end_char]})
+        return answers[0] if single else answers
+
+def _masked_softmax(logits, mask):
+    logits = np.where(mask, logits, -np.inf)
+    exp = np.exp(logits - logits.max())
+    return exp / exp.sum()
+
+@st.cache_resource(show_spinner="Preparing ONNX Runtime models...")
+def load_onnx_models(quantized=False):
+    """ONNX embedder and QA model, exported (and quantized) on first use"""
+    return OnnxSentenceEmbedder(quantized), OnnxQuestionAnswerer(quantized)
+
+def load_assistant_models(backend=AI_BACKEND):
+    """(sentence embedder, QA callable) for the requested backend"""
+    if backend in ("onnx", "onnx-int8"):
+        return load_onnx_models(quantized=backend == "onnx-int8")
+    get_ml_module('torch').set_num_threads(INFERENCE_THREADS)
+    sentence_model = get_ml_module('sentence_transformers').SentenceTransformer(EMBEDDING_MODEL_NAME)
+    qa_pipeline = get_ml_module('transformers').pipeline("question-answering", model=QA_MODEL_NAME)
+    return sentence_model, qa_pipeline
+
+BENCHMARK_QA_CASES = [
+    ("What is the tensile strength of property class 8.8?",
+     "Property class 8.8 bolts have a minimum tensile strength of 800 MPa and a minimum yield strength of 640 MPa."),
+    ("What is the maximum carbon content of Grade 5?",
+     "Grade 5 is a medium carbon steel with carbon between 0.28% and 0.55%, quenched and tempered."),
+    ("Which material is used for B7 studs?",
+     "ASTM A193 B7 studs are made from chromium molybdenum alloy steel, quenched and tempered."),
+]
+
+def benchmark_ai_backends(sample_texts, backends=AI_BACKENDS, repeats=3):
+    """Latency and parity of each backend against the first one that loads (torch by default).
+    
+    Parity is the minimum embedding cosine similarity and the share of identical QA answers.
+    """
+    results = []
+    reference_backend, reference_embeddings, reference_answers = None, None, None
+    for backend in backends:
+        try:
+            embedder, qa_model = load_assistant_models(backend)
+            
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                embeddings = np.asarray(embedder.encode(sample_texts, batch_size=32, convert_to_numpy=True,
+                                                        show_progress_bar=False), dtype=np.float32)
+            embed_ms = (time.perf_counter() - start_time) * 1000 / repeats
+            
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                answers = [qa_model(question=question, context=context)['answer'].strip()
+                           for question, context in BENCHMARK_QA_CASES]
+            qa_ms = (time.perf_counter() - start_time) * 1000 / (repeats * len(BENCHMARK_QA_CASES))
+            
+            normalized = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+            if reference_embeddings is None:
+                reference_backend, reference_embeddings, reference_answers = backend, normalized, answers
+            results.append({
+                'backend': backend,
+                'embed_batch_ms': embed_ms,
+                'embed_ms_per_text': embed_ms / max(len(sample_texts), 1),
+                'qa_ms_per_question': qa_ms,
+                'reference': reference_backend,
+                'min_cosine_vs_reference': float((normalized * reference_embeddings).sum(axis=1).min()),
+                'qa_answer_agreement': float(np.mean([a == b for a, b in zip(answers, reference_answers)])),
+                'error': None,
+            })
+        except Exception as e:
+            results.append({'backend': backend, 'error': str(e)})
+    return pd.DataFrame(results)
+
+# ======================================================
+# SHARED MICRO-BATCHED INFERENCE
+# ======================================================
+# Requests arriving within this window of the first queued one run as one model call
+INFERENCE_BATCH_WINDOW_MS = float(os.environ.get("FASTENER_BATCH_WINDOW_MS", "5"))
+INFERENCE_MAX_BATCH_SIZE = 32
+INFERENCE_REQUEST_TIMEOUT = 60
+# The worker thread exits after this long without requests and is restarted by the next one
+INFERENCE_IDLE_SECONDS = 30
+INFERENCE_METRICS_WINDOW = 1000
+
+class MicroBatcher:
+    """Queue shared by all sessions that runs concurrent single-item requests as one batch.
+    
+    run_batch takes a list of items and returns one result per item. A single worker thread
+    calls it, so model inference never runs on several threads at once.
+    """
+    
+    def __init__(self, name, run_batch, window_ms=INFERENCE_BATCH_WINDOW_MS, max_batch_size=INFERENCE_MAX_BATCH_SIZE):
+        self.name = name
+        self.run_batch = run_batch
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._queue_wait_ms = []
+        self._batch_sizes = []
+        self.requests = 0
+        self.batches = 0
+    
+    def submit(self, item):
+        """Future for the result of one item"""
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"inference-{self.name}", daemon=True)
+                self._worker.start()
+        return future
+    
+    def __call__(self, item, timeout=INFERENCE_REQUEST_TIMEOUT):
+        return self.submit(item).result(timeout=timeout)
+    
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=INFERENCE_IDLE_SECONDS)]
+        except queue.Empty:
+            return []
+        deadline = batch[0][2] + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                with self._lock:
+                    # A request queued while the worker was timing out keeps it running
+                    if self._queue.empty():
+                        self._worker = None
+                        return
+                continue
+            
+            started = time.perf_counter()
+            try:
+                results = self.run_batch([item for item, _, _ in batch])
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            
+            with self._lock:
+                self.requests += len(batch)
+                self.batches += 1
+                self._batch_sizes.append(len(batch))
+                self._queue_wait_ms.extend((started - enqueued) * 1000 for _, _, enqueued in batch)
+                del self._batch_sizes[:-INFERENCE_METRICS_WINDOW]
+                del self._queue_wait_ms[:-INFERENCE_METRICS_WINDOW]
+    
+    def stats(self):
+        """Request and batch counts with batch-size and queue-wait summaries over the recent window"""
+        with self._lock:
+            batch_sizes = list(self._batch_sizes)
+            queue_wait = list(self._queue_wait_ms)
+            requests, batches = self.requests, self.batches
+        return {
+            'model': self.name,
+            'requests': requests,
+            'batches': batches,
+            'mean_batch_size': float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+            'max_batch_size': max(batch_sizes, default=0),
+            'queue_wait_p50_ms': float(np.percentile(queue_wait, 50)) if queue_wait else 0.0,
+            'queue_wait_p95_ms': float(np.percentile(queue_wait, 95)) if queue_wait else 0.0,
+        }
+
+def embedding_batcher(sentence_model):
+    """Micro-batcher over sentence_model.encode - one text in, one embedding out"""
+    def run_batch(texts):
+        return list(sentence_model.encode(texts, batch_size=INFERENCE_MAX_BATCH_SIZE,
+                                          convert_to_numpy=True, show_progress_bar=False))
+    return MicroBatcher("embedder", run_batch)
+
+def qa_batcher(qa_model):
+    """Micro-batcher over the QA model - one (question, context) pair in, one answer dict out"""
+    def run_batch(pairs):
+        answers = qa_model(question=[question for question, _ in pairs], context=[context for _, context in pairs],
+                           batch_size=len(pairs))
+        # The pipeline returns a bare dict for a single pair
+        return [answers] if isinstance(answers, dict) else list(answers)
+    return MicroBatcher("qa", run_batch)
+
+# ======================================================
+# SEMANTIC RETRIEVAL BACKENDS
+# ======================================================
+# Corpora up to this many rows are searched with an in-memory embedding matrix instead of the vector DB
+DENSE_RETRIEVAL_MAX_ROWS = int(os.environ.get("FASTENER_DENSE_MAX_ROWS", "20000"))
+DENSE_RETRIEVAL_FLOAT16 = os.environ.get("FASTENER_DENSE_FLOAT16", "0") == "1"
+RETRIEVAL_LATENCY_WINDOW = 500
+RETRIEVAL_BENCHMARK_QUERIES = [
+    "Grade 5 hex bolt 1/2-13", "tensile strength property class 8.8", "carbon content B7 stud",
+    "heavy hex bolt 3/4 width across flats", "ISO 4014 M12 head height", "stainless steel 316 chemistry",
+    "DIN 7991 countersunk M8", "socket head cap screw #10 body diameter", "hardness HRC 10.9", "yield strength 304",
+]
+
+class DenseMatrixRetriever:
+    """Exact cosine search with one matrix-vector product over L2-normalized embeddings"""
+    name = "dense-matrix"
+    
+    def __init__(self, embeddings, ids, documents, metadatas, use_float16=False):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+        self.matrix = matrix.astype(np.float16) if use_float16 else matrix
+        self.ids = np.asarray(ids, dtype=object)
+        self.documents = np.asarray(documents, dtype=object)
+        self.metadatas = list(metadatas)
+    
+    def query(self, query_embedding, n_results=5):
+        query_vector = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+        scores = self.matrix @ query_vector.astype(self.matrix.dtype)
+        n_results = min(n_results, len(scores))
+        top = np.argpartition(-scores, n_results - 1)[:n_results]
+        top = top[np.argsort(-scores[top])]
+        # Same shape as a Chroma query result, cosine distance = 1 - similarity
+        return {
+            'ids': [self.ids[top].tolist()],
+            'documents': [self.documents[top].tolist()],
+            'metadatas': [[self.metadatas[i] for i in top]],
+            'distances': [(1.0 - scores[top].astype(np.float32)).tolist()],
+        }
+
+class ChromaRetriever:
+    """Vector DB query through the Chroma collection"""
+    name = "chroma"
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    def query(self, query_embedding, n_results=5):
+        return self.collection.query(
+            query_embeddings=[np.asarray(query_embedding, dtype=np.float32).reshape(-1).tolist()],
+            n_results=n_results
+        )
+
+class RetrievalLatency:
+    """Rolling per-backend query latencies"""
+    
+    def __init__(self, window=RETRIEVAL_LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self.window = window
+    
+    def record(self, backend, elapsed_ms):
+        with self._lock:
+            samples = self._samples.setdefault(backend, [])
+            samples.append(elapsed_ms)
+            del samples[:-self.window]
+    
+    def summary(self):
+        with self._lock:
+            rows = [{'backend': backend, 'queries': len(samples),
+                     'p50_ms': float(np.percentile(samples, 50)), 'p95_ms': float(np.percentile(samples, 95))}
+                    for backend, samples in self._samples.items() if samples]
+        return pd.DataFrame(rows)
+
+# ======================================================
+# LEXICAL (BM25) INDEX AND HYBRID FUSION
+# ======================================================
+# Mixed-number inch sizes (1-1/2, 1-1/2-6) come first so they are not split at the fraction
+MIXED_SIZE_PATTERN = re.compile(r"(\d+-\d+/\d+)(-\d+)?")
+# Spec tokens: thread designations (5/8-11, #10-24), metric threads (M12x1.25), fractions, classes (8.8, B7), #10 sizes
+SPEC_TOKEN_PATTERN = re.compile(r"\d+-\d+/\d+(?:-\d+)?|#?\d+(?:/\d+)?-\d+|#?\d+/\d+|m\d+(?:\.\d+)?(?:x\d+(?:\.\d+)?)?|[a-z]*\d+(?:\.\d+)?[a-z]*\d*|[a-z]+")
+METRIC_THREAD_SPACING = re.compile(r"\b(m\d+(?:\.\d+)?)\s*x\s*(\d+(?:\.\d+)?)")
+# Words that form one token with the value after them - 'grade 8' -> 'grade_8'
+SPEC_PREFIX_WORDS = {"grade", "class", "type", "size", "astm", "sae", "iso", "din", "asme"}
+LEXICAL_STOPWORDS = {"the", "a", "an", "of", "in", "for", "is", "what", "and", "to", "me", "show", "with", "on", "are", "does"}
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+EXACT_QUERY_MAX_TOKENS = 4
+
+def tokenize_spec_text(text):
+    """Lowercase spec-aware tokens plus prefix bigrams ('grade_8') and thread sizes ('5/8-11' also gives '5/8', '1-1/2-6' gives '1-1/2')"""
+    text = METRIC_THREAD_SPACING.sub(r"\1x\2", str(text).lower())
+    words = [token for token in SPEC_TOKEN_PATTERN.findall(text) if token not in LEXICAL_STOPWORDS]
+    tokens = list(words)
+    for previous, current in zip(words, words[1:]):
+        if previous in SPEC_PREFIX_WORDS:
+            tokens.append(f"{previous}_{current}")
+    for word in words:
+        mixed_size = MIXED_SIZE_PATTERN.fullmatch(word)
+        if mixed_size:
+            if mixed_size.group(2):
+                tokens.append(mixed_size.group(1))
+        elif '-' in word:
+            tokens.append(word.split('-')[0])
+        elif word.startswith('m') and 'x' in word and word[1:2].isdigit():
+            tokens.append(word.split('x')[0])
+    return tokens
+
+def is_spec_token(token):
+    """Thread, size or class token - bare integers ('8' in 'Grade 8') are too ambiguous to count"""
+    return any(ch.isdigit() for ch in token) and not token.isdigit()
+
+class BM25Index:
+    """Inverted index with BM25 scoring over the same row texts as the vector index"""
+    name = "lexical"
+    
+    def __init__(self, ids, documents, metadatas):
+        self.ids = np.asarray(ids, dtype=object)
+        self.documents = np.asarray(documents, dtype=object)
+        self.metadatas = list(metadatas)
+        self.positions = {doc_id: idx for idx, doc_id in enumerate(ids)}
+        
+        postings = {}
+        doc_lengths = np.zeros(len(documents), dtype=np.float32)
+        for doc_idx, document in enumerate(documents):
+            tokens = tokenize_spec_text(document)
+            doc_lengths[doc_idx] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(doc_idx)
+                postings[token][1].append(count)
+        
+        doc_count = max(len(documents), 1)
+        average_length = float(doc_lengths.mean()) if len(documents) else 1.0
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(average_length, 1e-9))
+        
+        # Per-token (doc indices, precomputed BM25 weights) - a query is a sum of sparse vectors
+        self.postings = {}
+        for token, (doc_indices, counts) in postings.items():
+            doc_indices = np.asarray(doc_indices, dtype=np.int32)
+            tf = np.asarray(counts, dtype=np.float32)
+            idf = math.log(1 + (doc_count - len(doc_indices) + 0.5) / (len(doc_indices) + 0.5))
+            self.postings[token] = (doc_indices, idf * tf * (BM25_K1 + 1) / (tf + length_norm[doc_indices]))
+    
+    def search(self, query_tokens, n_results=5):
+        """Top rows as (doc indices, scores) - only rows sharing at least one token are returned"""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for token in set(query_tokens):
+            if token in self.postings:
+                doc_indices, weights = self.postings[token]
+                scores[doc_indices] += weights
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return matched, scores[matched]
+        top = matched[np.argsort(-scores[matched], kind='stable')[:n_results]]
+        return top, scores[top]
+    
+    def to_results(self, doc_indices, scores):
+        """Chroma-shaped result - distance is the negated BM25 score"""
+        return {
+            'ids': [self.ids[doc_indices].tolist()],
+            'documents': [self.documents[doc_indices].tolist()],
+            'metadatas': [[self.metadatas[i] for i in doc_indices]],
+            'distances': [(-np.asarray(scores, dtype=np.float32)).tolist()],
+        }
+
+def fuse_ranked_ids(rankings, n_results=5):
+    """Reciprocal rank fusion of several ranked id lists"""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)[:n_results]
+
+# ======================================================
+# STRUCTURED-QUERY FAST PATH
+# ======================================================
+# Entity property -> ME&CERT column stems (each has '(Min)' / '(Max)' columns) and display label
+STRUCTURED_PROPERTY_COLUMNS = {
+    'carbon': [('C', 'Carbon (C%)')],
+    'manganese': [('Mn', 'Manganese (Mn%)')],
+    'phosphorus': [('P', 'Phosphorus (P%)')],
+    'sulfur': [('S', 'Sulfur (S%)')],
+    'tensile': [('Tensile Strength', 'Tensile Strength')],
+    'yield': [('Yield Strength', 'Yield Strength')],
+    'elongation': [('Elongation', 'Elongation')],
+    'hardness': [('HRC', 'Hardness HRC'), ('HRB', 'Hardness HRB')],
+}
+
+PROPERTY_CLASS_PREFIXES = ('PROPERTY CLASS ', 'CLASS ', 'GRADE ', 'GR. ', 'GR ', 'STAINLESS ')
+
+def normalize_property_class(value):
+    """Property class key for lookups - 'Grade 8' / 'gr 8' -> '8', 'Class 8.8' -> '8.8', ' b7 ' -> 'B7'"""
+    value = re.sub(r'\s+', ' ', str(value).strip().upper())
+    for prefix in PROPERTY_CLASS_PREFIXES:
+        if value.startswith(prefix):
+            return value[len(prefix):]
+    return value
+
+def _spec_value(value):
+    """Cell text, or None for blank / '---' placeholders"""
+    if pd.isna(value):
+        return None
+    value = str(value).strip()
+    return None if value in ('', '---', '—', '-') else value
+
+# ======================================================
+# GRADE KNOWLEDGE FROM THE ME&CERT SHEET
+# ======================================================
+PROPERTY_VALUE_PATTERN = re.compile(r'^((?:HR|R)?[A-Za-z])?\s*(-?\d+(?:\.\d+)?)\s*([A-Za-z%]*)$')
+PROPERTY_UNIT_ALIASES = {'mpa': 'MPa', 'ksi': 'ksi', 'psi': 'psi', '%': '%'}
+# Summary lines of the generated grade entries: (label, column stem) - chemistry cells are percentages
+GRADE_CHEMISTRY_STEMS = [('C', 'C'), ('Mn', 'Mn'), ('P', 'P'), ('S', 'S'), ('Si', 'Si'), ('Cr', 'Cr'),
+                         ('Ni', 'Ni'), ('Mo', 'Mo'), ('B', 'B'), ('Cu', 'Cu')]
+GRADE_MECHANICAL_STEMS = [('Tensile', 'Tensile Strength'), ('Yield', 'Yield Strength')]
+GRADE_HARDNESS_STEMS = [('HRC', 'HRC'), ('HRB', 'HRB')]
+CHEMISTRY_STEMS = {stem for _, stem in GRADE_CHEMISTRY_STEMS}
+# SAE J429 grades are not in the ME&CERT sheet - the assistant keeps these built-in entries for them
+SAE_J429_GRADES = {
+    'Grade 2': {
+        'description': 'Low carbon steel for general purpose applications',
+        'chemistry': 'C: 0.05-0.31%, Mn: 0.90% max, P: 0.04% max, S: 0.05% max',
+        'mechanical': 'Tensile: 74,000 psi min, Yield: 57,000 psi min',
+        'hardness': 'RB 70-100',
+        'applications': 'General purpose, low stress applications'
+    },
+    'Grade 5': {
+        'description': 'Medium carbon steel, quenched and tempered',
+        'chemistry': 'C: 0.28-0.55%, Mn: 0.60% max, P: 0.04% max, S: 0.05% max',
+        'mechanical': 'Tensile: 120,000 psi min, Yield: 92,000 psi min',
+        'hardness': 'RC 25-34',
+        'applications': 'Automotive, machinery, construction'
+    },
+    'Grade 8': {
+        'description': 'Medium carbon alloy steel, quenched and tempered',
+        'chemistry': 'C: 0.36-0.55%, Mn: 0.90% max, P: 0.04% max, S: 0.05% max',
+        'mechanical': 'Tensile: 150,000 psi min, Yield: 130,000 psi min',
+        'hardness': 'RC 33-39',
+        'applications': 'High-strength applications, automotive suspension'
+    },
+}
+
+def parse_property_value(value):
+    """(number, unit) of a property cell - '800 Mpa' -> (800.0, 'MPa'), 'B80' / 'RB 80' -> (80.0, 'HRB'), '---' -> (None, None)"""
+    text = _spec_value(value)
+    if text is None:
+        return None, None
+    match = PROPERTY_VALUE_PATTERN.match(text.replace(',', ''))
+    if not match:
+        return None, None
+    scale, number, unit = match.groups()
+    if scale:
+        # Hardness cells like 'B80' / 'RC 32' carry the Rockwell scale as a prefix
+        return float(number), f"HR{scale[-1].upper()}"
+    return float(number), PROPERTY_UNIT_ALIASES.get(unit.lower(), unit)
+
+def format_property_range(low, high, unit=''):
+    """'0.28-0.55%', '800 MPa min', '0.55% max' - None when both ends are blank"""
+    def fmt(number):
+        return f"{number:g}"
+    spacer = '' if unit in ('', '%') else ' '
+    if low is not None and high is not None:
+        return f"{fmt(low)}-{fmt(high)}{spacer}{unit}"
+    if low is not None:
+        return f"{fmt(low)}{spacer}{unit} min"
+    if high is not None:
+        return f"{fmt(high)}{spacer}{unit} max"
+    return None
+
+MECHEM_CLASS_COLUMN_HINTS = ['Grade', 'Class', 'Property Class', 'Material Grade', 'Type', 'Designation', 'Material']
+MECHEM_STANDARD_COLUMN_HINTS = ['Standard', 'Specification', 'Norm', 'Type', 'Designation']
+MECHEM_STANDARD_COLUMN_WORDS = ['iso', 'astm', 'asme', 'din', 'bs', 'jis', 'gb']
+
+def _lookup_tokens(value):
+    """Lower-case word tokens of a cell or query - 'ASTM A193/A193M' -> {'astm', 'a193', 'a193m'}"""
+    return {token.strip('.') for token in re.split(r'[^a-z0-9.]+', str(value).lower()) if token.strip('.')}
+
+class GradeKnowledge:
+    """ME&CERT rows grouped by normalized property class with parsed min/max values per property.
+    
+    Built once per catalog version. Lookups by any alias ('Grade 8.8', 'class 8.8', '8.8') are
+    dict hits, and the assistant's per-property answers are pre-formatted.
+    
+    The same object holds the Section C row index: every class-like column maps its normalized
+    values and its word tokens to row positions. A class or standard lookup walks the columns in
+    order and takes the first exact-key match, then the first all-tokens match.
+    """
+    
+    def __init__(self, mechem_df):
+        self.entries = {}
+        self.size = 0 if mechem_df is None else len(mechem_df)
+        self.class_columns, self.standard_columns = [], []
+        self._exact, self._tokens, self._row_standards = {}, {}, []
+        if mechem_df is None or mechem_df.empty:
+            return
+        self._build_row_index(mechem_df)
+        if 'Property Class' not in mechem_df.columns:
+            return
         
+        stems = [str(column)[:-len(' (Min)')] for column in mechem_df.columns if str(column).endswith(' (Min)')]
+        class_keys = mechem_df['Property Class'].map(normalize_property_class)
+        for class_key, positions in class_keys.groupby(class_keys).indices.items():
+            rows = mechem_df.iloc[positions]
+            parsed_rows = []
+            for _, row in rows.iterrows():
+                properties = {}
+                for stem in stems:
+                    low, low_unit = parse_property_value(row.get(f"{stem} (Min)"))
+                    high, high_unit = parse_property_value(row.get(f"{stem} (Max)"))
+                    if low is None and high is None:
+                        continue
+                    properties[stem] = {
+                        'min': low, 'max': high, 'min_unit': low_unit, 'max_unit': high_unit,
+                        'min_text': _spec_value(row.get(f"{stem} (Min)")), 'max_text': _spec_value(row.get(f"{stem} (Max)")),
+                    }
+                parsed_rows.append({
+                    'standard': _spec_value(row.get('Standard')),
+                    'size': _spec_value(row.get('Size')),
+                    'size_preference': _spec_value(row.get('Size preference')),
+                    'material': _spec_value(row.get('Material and Heat Treatment')),
+                    'properties': properties,
+                })
+            
+            property_class = str(rows['Property Class'].iloc[0]).strip()
+            entry = {
+                'property_class': property_class,
+                'positions': positions,
+                'standards': sorted({row['standard'] for row in parsed_rows if row['standard']}),
+                'rows': parsed_rows,
+            }
+            entry['answers'] = self._format_answers(entry)
+            entry['summary'] = self._summarize(entry)
+            self.entries[class_key] = entry
+    
+    def _build_row_index(self, mechem_df):
+        """Row positions of every class-like and standard-like column by normalized value and by word token"""
+        columns = [str(col) for col in mechem_df.columns]
+        self.class_columns = [col for col in columns
+                              if any(hint.lower() in col.lower() for hint in MECHEM_CLASS_COLUMN_HINTS)]
+        if not self.class_columns:
+            self.class_columns = [col for col in columns[:3] if mechem_df[col].dtype == 'object'][:1]
+        self.standard_columns = [col for col in columns
+                                 if any(hint.lower() in col.lower() for hint in MECHEM_STANDARD_COLUMN_HINTS)]
+        if not self.standard_columns:
+            self.standard_columns = [col for col in columns
+                                     if any(word in col.lower() for word in MECHEM_STANDARD_COLUMN_WORDS)][:1]
+        
+        for col in dict.fromkeys(self.class_columns + self.standard_columns):
+            exact, tokens = {}, {}
+            for position, value in enumerate(mechem_df[col].to_numpy(dtype=object)):
+                if pd.isna(value) or str(value).strip() == '':
+                    continue
+                exact.setdefault(normalize_property_class(value), []).append(position)
+                for token in _lookup_tokens(value):
+                    tokens.setdefault(token, set()).add(position)
+            self._exact[col] = {key: np.asarray(positions, dtype=np.int64) for key, positions in exact.items()}
+            self._tokens[col] = tokens
+        
+        # Distinct standards of every row, for the standards-of-a-class lookup
+        standard_values = mechem_df[self.standard_columns].to_numpy(dtype=object) if self.standard_columns else []
+        self._row_standards = [[str(value).strip() for value in row if pd.notna(value) and str(value).strip() != '']
+                               for row in standard_values]
+    
+    def _resolve(self, columns, value, within=None):
+        key = normalize_property_class(value)
+        query_tokens = _lookup_tokens(value)
+        for col in columns:
+            positions = self._exact[col].get(key)
+            if positions is not None and within is not None:
+                positions = positions[np.isin(positions, within)]
+            if positions is not None and positions.size:
+                return positions
+            
+            # Every query token present in the cell - the token form of the old str.contains match
+            if query_tokens:
+                matched = set.intersection(*[self._tokens[col].get(token, set()) for token in query_tokens])
+                positions = np.fromiter(sorted(matched), dtype=np.int64, count=len(matched))
+                if within is not None:
+                    positions = positions[np.isin(positions, within)]
+                if positions.size:
+                    return positions
+        return np.zeros(0, dtype=np.int64)
+    
+    def class_rows(self, property_class):
+        """Row positions of a property class (any alias), empty when it is unknown"""
+        return self._resolve(self.class_columns, property_class)
+    
+    def standard_rows(self, standard, within=None):
+        """Row positions of a standard, optionally restricted to the given positions"""
+        return self._resolve(self.standard_columns, standard, within)
+    
+    def standards_for(self, positions):
+        """Sorted distinct standards of the given rows"""
+        return sorted({standard for position in positions for standard in self._row_standards[position]})
+
+    @staticmethod
+    def _format_answers(entry):
+        """Assistant answer text per entity property (see STRUCTURED_PROPERTY_COLUMNS)"""
+        answers = {}
+        for prop, columns in STRUCTURED_PROPERTY_COLUMNS.items():
+            lines = []
+            for stem, label in columns:
+                for row in entry['rows']:
+                    parsed = row['properties'].get(stem)
+                    if parsed is None:
+                        continue
+                    low, high = parsed['min_text'], parsed['max_text']
+                    # Rows of one class differ by size preference ('d ≤ 16 mm'); few rows carry a plain size
+                    row_size = row['size_preference'] or row['size']
+                    scope = f"{row['standard'] or ''} {entry['property_class']}" + (f" ({row_size})" if row_size else "")
+                    value = f"{low} – {high}" if low and high else (f"{low} min" if low else f"{high} max")
+                    line = f"• {scope}: {label} {value}"
+                    if line not in lines:
+                        lines.append(line)
+            if lines:
+                answers[prop] = "\n".join(
+                    [f"**{entry['property_class']} - {prop.title()} (from ME&CERT database):**"] + lines)
+        return answers
+    
+    @staticmethod
+    def _summarize(entry):
+        """Grade entry in the assistant's knowledge-base format, from the first row carrying each property.
+        
+        A value is suffixed with that row's size preference, since other sizes of the class may differ.
+        """
+        hardness_stems = {stem for _, stem in GRADE_HARDNESS_STEMS}
+        ranges = {}
+        for row in entry['rows']:
+            for stem, parsed in row['properties'].items():
+                if stem in ranges:
+                    continue
+                # Unitless cells: chemistry is in %, hardness in the column's own Rockwell scale
+                default_unit = '%' if stem in CHEMISTRY_STEMS else (stem if stem in hardness_stems else '')
+                low_unit, high_unit = parsed['min_unit'] or default_unit, parsed['max_unit'] or default_unit
+                if parsed['min'] is not None and parsed['max'] is not None and low_unit != high_unit:
+                    # e.g. 'B80' / 'C32' - the two limits are on different scales
+                    ranges[stem] = (f"{format_property_range(parsed['min'], None, low_unit)}, "
+                                    f"{format_property_range(None, parsed['max'], high_unit)}")
+                else:
+                    ranges[stem] = format_property_range(parsed['min'], parsed['max'],
+                                                         low_unit if parsed['min'] is not None else high_unit)
+                row_size = row['size_preference'] or row['size']
+                if row_size:
+                    ranges[stem] = f"{ranges[stem]} ({row_size})"
+        
+        chemistry = [f"{label}: {ranges[stem]}" for label, stem in GRADE_CHEMISTRY_STEMS if ranges.get(stem)]
+        mechanical = [f"{label}: {ranges.get(stem) or 'N/A'}" for label, stem in GRADE_MECHANICAL_STEMS]
+        hardness = [ranges[stem] for _, stem in GRADE_HARDNESS_STEMS if ranges.get(stem)]
+        materials = [row['material'] for row in entry['rows'] if row['material']]
+        return {
+            'description': materials[0] if materials else f"Property class {entry['property_class']}",
+            'chemistry': ", ".join(chemistry),
+            'mechanical': ", ".join(mechanical),
+            'hardness': ", ".join(hardness) or 'N/A',
+            'applications': f"Per {', '.join(entry['standards'])}" if entry['standards'] else 'N/A',
+        }
+    
+    def lookup(self, grade):
+        """Entry of a grade under any of its aliases, or None"""
+        return self.entries.get(normalize_property_class(grade))
+    
+    def grade_properties(self):
+        """Display name -> summary for the assistant's knowledge base"""
+        return {entry['property_class']: entry['summary'] for entry in self.entries.values()}
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_grade_knowledge(catalog_version):
+    """Grade knowledge of the loaded ME&CERT sheet - shared by Section C and the assistant"""
+    return GradeKnowledge(df_mechem)
+
+# ======================================================
+# NORMALIZED MATERIAL PROPERTY STORE
+# ======================================================
+PROPERTY_RANGE_PATTERN = re.compile(
+    r'^((?:HR|R)?[BC])?\s*(-?\d+(?:\.\d+)?)\s*(?:-|–|to)\s*(-?\d+(?:\.\d+)?)\s*([A-Za-z%]*)$', re.IGNORECASE)
+PROPERTY_BOUND_PATTERN = re.compile(r'^(.*?)\s*\b(min|max)\.?$', re.IGNORECASE)
+# Unit -> (SI unit, factor) - stresses go to MPa, percentages and hardness scales stay as they are
+SI_UNIT_FACTORS = {'MPa': ('MPa', 1.0), 'ksi': ('MPa', 6.894757), 'psi': ('MPa', 0.006894757)}
+PERCENT_PROPERTY_STEMS = {'Elongation', 'Reduction'}
+HARDNESS_STEMS = {'HRC', 'HRB'}
+# Query words -> ME&CERT property stem, besides the stems themselves ('C', 'Mn', 'HRC', ...)
+PROPERTY_QUERY_ALIASES = {
+    'tensile': 'Tensile Strength', 'tensile strength': 'Tensile Strength', 'uts': 'Tensile Strength',
+    'yield': 'Yield Strength', 'yield strength': 'Yield Strength', 'proof load': 'Proof Load',
+    'carbon': 'C', 'manganese': 'Mn', 'phosphorus': 'P', 'sulfur': 'S', 'silicon': 'Si', 'chromium': 'Cr',
+    'nickel': 'Ni', 'molybdenum': 'Mo', 'copper': 'Cu', 'boron': 'B', 'elongation': 'Elongation',
+    'reduction': 'Reduction', 'hardness': 'HRC',
+}
+PROPERTY_CONDITION_PATTERN = re.compile(
+    r'([A-Za-z][A-Za-z ]*?)\s*%?\s*(>=|≥|<=|≤|>|<)\s*(-?\d[\d,]*(?:\.\d+)?)\s*([A-Za-z%]*)')
+# Clause separators - a comma followed by a three-digit group is a thousands separator ('120,000 psi')
+PROPERTY_CLAUSE_SEPARATOR = re.compile(r'\band\b|,(?!\d{3}\b)|;', re.IGNORECASE)
+
+def parse_property_range(value, side=None):
+    """(min, max, unit) of a display value.
+    
+    '0.28-0.55' -> (0.28, 0.55, ''), '120,000 psi min' -> (120000.0, None, 'psi'),
+    'RC 25-34' -> (25.0, 34.0, 'HRC'). A bare number is assigned to side ('min' or 'max').
+    """
+    text = _spec_value(value)
+    if text is None:
+        return None, None, None
+    text = text.replace(',', '')
+    bound = PROPERTY_BOUND_PATTERN.match(text)
+    if bound:
+        text, side = bound.group(1), bound.group(2).lower()
+    else:
+        span = PROPERTY_RANGE_PATTERN.match(text)
+        if span:
+            scale, low, high, unit = span.groups()
+            unit = f"HR{scale[-1].upper()}" if scale else PROPERTY_UNIT_ALIASES.get(unit.lower(), unit)
+            return float(low), float(high), unit
+    number, unit = parse_property_value(text)
+    if number is None:
+        return None, None, None
+    return (number, None, unit) if side == 'min' else (None, number, unit) if side == 'max' else (number, number, unit)
+
+def to_si_units(values, unit):
+    """(values in SI, SI unit) - MPa for ksi/psi, anything else unchanged"""
+    si_unit, factor = SI_UNIT_FACTORS.get(unit, (unit, 1.0))
+    return values * factor, si_unit
+
+def build_property_store(mechem_df):
+    """Long table of the ME&CERT sheet: one row per (sheet row, property) with SI min / max.
+    
+    Columns: row (sheet position), standard, grade, property, min, max, unit. Chemistry,
+    elongation and reduction are in %, stresses in MPa, hardness on its Rockwell scale - a
+    'B80' cell in the HRC column is filed under HRB.
+    """
+    columns = ['row', 'standard', 'grade', 'property', 'min', 'max', 'unit']
+    if mechem_df is None or mechem_df.empty:
+        return pd.DataFrame(columns=columns)
+    
+    stems = [str(column)[:-len(' (Min)')] for column in mechem_df.columns if str(column).endswith(' (Min)')]
+    standards = mechem_df['Standard'].map(_spec_value) if 'Standard' in mechem_df.columns else pd.Series(None, index=mechem_df.index)
+    grades = mechem_df['Property Class'].map(normalize_property_class) if 'Property Class' in mechem_df.columns else standards
+    records = {column: [] for column in columns}
+    for stem in stems:
+        min_cells = mechem_df[f"{stem} (Min)"].to_numpy(dtype=object)
+        max_cells = (mechem_df[f"{stem} (Max)"].to_numpy(dtype=object) if f"{stem} (Max)" in mechem_df.columns
+                     else np.full(len(mechem_df), None, dtype=object))
+        default_unit = '%' if stem in CHEMISTRY_STEMS or stem in PERCENT_PROPERTY_STEMS else (stem if stem in HARDNESS_STEMS else '')
+        for position, (min_cell, max_cell) in enumerate(zip(min_cells, max_cells)):
+            low, _, low_unit = parse_property_range(min_cell, side='min')
+            _, high, high_unit = parse_property_range(max_cell, side='max')
+            # Limits on different scales ('B80' / 'C32') become separate properties
+            bounds = ([(low, None, low_unit or default_unit), (None, high, high_unit or default_unit)]
+                      if low is not None and high is not None and (low_unit or default_unit) != (high_unit or default_unit)
+                      else [(low, high, low_unit or high_unit or default_unit)])
+            for bound_low, bound_high, unit in bounds:
+                if bound_low is None and bound_high is None:
+                    continue
+                records['row'].append(position)
+                records['standard'].append(standards.iloc[position])
+                records['grade'].append(grades.iloc[position])
+                records['property'].append(unit if stem in HARDNESS_STEMS and unit in HARDNESS_STEMS else stem)
+                records['min'].append(np.nan if bound_low is None else bound_low)
+                records['max'].append(np.nan if bound_high is None else bound_high)
+                records['unit'].append(unit)
+    
+    store = pd.DataFrame(records, columns=columns)
+    store['row'] = store['row'].astype(np.int64)
+    store['min'] = store['min'].astype(np.float64)
+    store['max'] = store['max'].astype(np.float64)
+    # Stresses to MPa, one unit group at a time
+    for unit in store['unit'].unique():
+        if unit in SI_UNIT_FACTORS:
+            si_unit, factor = SI_UNIT_FACTORS[unit]
+            in_unit = (store['unit'] == unit).to_numpy()
+            store.loc[in_unit, ['min', 'max']] *= factor
+            store.loc[in_unit, 'unit'] = si_unit
+    for column in ('standard', 'grade', 'property', 'unit'):
+        store[column] = store[column].astype('category')
+    return store
+
+def parse_property_conditions(text):
+    """([(property stem, operator, SI value)], [unrecognized clauses]) from text like
+    'tensile >= 830 MPa and C% <= 0.4' or 'tensile strength >= 120,000 psi'
+    """
+    stem_lookup = {stem.lower(): stem for stem in list(CHEMISTRY_STEMS) + list(HARDNESS_STEMS) + list(PERCENT_PROPERTY_STEMS)}
+    stem_lookup.update(PROPERTY_QUERY_ALIASES)
+    conditions, unrecognized = [], []
+    for clause in PROPERTY_CLAUSE_SEPARATOR.split(text):
+        if not clause.strip():
+            continue
+        match = PROPERTY_CONDITION_PATTERN.search(clause)
+        stem = stem_lookup.get(re.sub(r'\s+', ' ', match.group(1).strip().lower())) if match else None
+        if stem is None:
+            unrecognized.append(clause.strip())
+            continue
+        _, operator, number, unit = match.groups()
+        value, _ = to_si_units(float(number.replace(',', '')), PROPERTY_UNIT_ALIASES.get(unit.lower(), unit))
+        conditions.append((stem, {'≥': '>=', '≤': '<='}.get(operator, operator), value))
+    return conditions, unrecognized
+
+class MaterialPropertyStore:
+    """Vectorized range queries over the long-format property table"""
+    
+    def __init__(self, mechem_df):
+        self.frame = build_property_store(mechem_df)
+    
+    def matching_rows(self, conditions):
+        """Sheet positions meeting every condition.
+        
+        '>=' / '>' are checked against the guaranteed minimum, '<=' / '<' against the guaranteed
+        maximum - rows without that limit do not qualify.
+        """
+        frame = self.frame
+        rows = None
+        for stem, operator, value in conditions:
+            in_property = (frame['property'] == stem).to_numpy()
+            if operator in ('>=', '>'):
+                limits = frame['min'].to_numpy()
+                passed = limits >= value if operator == '>=' else limits > value
+            else:
+                limits = frame['max'].to_numpy()
+                passed = limits <= value if operator == '<=' else limits < value
+            matched = np.unique(frame['row'].to_numpy()[in_property & passed])
+            rows = matched if rows is None else np.intersect1d(rows, matched)
+        return np.zeros(0, dtype=np.int64) if rows is None else rows
+    
+    def query(self, text):
+        """(conditions, matching sheet positions, unrecognized clauses) of a range query text"""
+        conditions, unrecognized = parse_property_conditions(text)
+        return conditions, self.matching_rows(conditions), unrecognized
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_property_store(catalog_version):
+    """Normalized property table of the loaded ME&CERT sheet"""
+    return MaterialPropertyStore(df_mechem)
+
+# ======================================================
+# EXTRACTIVE QA OVER RETRIEVED ROWS
+# ======================================================
+QA_TOP_K = 3
+# Context tokens per retrieved row - keeps every candidate inside one model window
+QA_CONTEXT_TOKEN_BUDGET = 200
+QA_MIN_SCORE = 0.05
+INDEX_SOURCE_LABELS = {
+    "main_db": "ASME B18.2.1", "iso_db": "ISO 4014", "mecert_db": "ME&CERT",
+    "din7991_db": "DIN-7991", "asme_b18_3_db": "ASME B18.3",
+}
+
+def row_context_text(row):
+    """'Column: value' sentences of a row's non-empty cells - the QA model needs the column names"""
+    return ". ".join(f"{str(column).strip()}: {value}" for column, value in row.items()
+                     if _spec_value(value) is not None) + "."
+
+def truncate_to_token_budget(tokenizer, text, budget=QA_CONTEXT_TOKEN_BUDGET):
+    """Text cut after its first budget tokens - whitespace words when no tokenizer is available"""
+    if tokenizer is None:
+        words = text.split()
+        return text if len(words) <= budget else " ".join(words[:budget])
+    encoded = tokenizer(text, add_special_tokens=False, truncation=True, max_length=budget,
+                        return_offsets_mapping=True)
+    offsets = encoded["offset_mapping"]
+    return text[:offsets[-1][1]] if offsets else text
+
+# ======================================================
+# CATALOG ENTITY MATCHER
+# ======================================================
+ENTITY_PROPERTY_KEYWORDS = {
+    'carbon': ['c%', 'carbon', 'carbon content'],
+    'tensile': ['tensile', 'ultimate strength', 'uts'],
+    'yield': ['yield', 'proof strength'],
+    'hardness': ['hardness', 'hrc', 'hrb', 'brinell'],
+    'elongation': ['elongation', 'ductility'],
+    'manganese': ['mn%', 'manganese'],
+    'phosphorus': ['p%', 'phosphorus'],
+    'sulfur': ['s%', 'sulfur'],
+}
+ENTITY_MATERIAL_KEYWORDS = {
+    'stainless steel': ['stainless', 'stainless steel'],
+    'carbon steel': ['carbon steel'],
+    'alloy steel': ['alloy', 'alloy steel'],
+    'brass': ['brass'],
+}
+ENTITY_VALUE_TYPE_KEYWORDS = {
+    'min': ['minimum', 'min'],
+    'max': ['maximum', 'max'],
+    'typical': ['typical', 'average'],
+    'range': ['range'],
+}
+# Grades the built-in knowledge base knows besides the ME&CERT property classes
+ENTITY_EXTRA_GRADES = ['2', '5', '8', 'L7', '410']
+STAINLESS_GRADES = {'304', '316', '410'}
+# Trailing edition year of a standard - 'ISO-4014-2011', 'ISO 898-1:2013'
+STANDARD_EDITION_PATTERN = re.compile(r'\s*[-:]\s*(?:19|20)\d{2}$')
+# Leading nominal size of a thread designation - 'M10X1.5', '1-1/2-6 UNC', '1/2-13', '10-24'
+THREAD_SIZE_PATTERN = re.compile(r'^(m\d+(?:\.\d+)?|\d+-\d+/\d+|\d+/\d+|\d+)(?:-(\d+(?:\.\d+)?))?')
+# Numbered inch sizes (#0-#12) have 24 or more threads per inch, whole-inch sizes at most 20
+NUMBERED_SIZE_MIN_TPI = 24
+
+def normalize_entity_text(text):
+    """Lower case, single spaces, metric threads without spaces - 'M10 X 1.5' -> 'm10x1.5'"""
+    text = re.sub(r'\s+', ' ', str(text).lower()).strip()
+    return METRIC_THREAD_SPACING.sub(r'\1x\2', text)
+
+def _trie_pattern(phrases):
+    """Regex of a character trie over the phrases - shared prefixes are matched once, longer phrases win"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = True
+    
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+    return emit(trie)
+
+def build_entity_vocabulary(product_frames, mechem_df=None, thread_frames=(), grade_names=(), standard_names=()):
+    """Phrase -> [(entity type, canonical value)] from the catalog sheets.
+    
+    Products and sizes come from the dimensional sheets, property classes and standards from
+    ME&CERT, thread designations from the thread sheets. Bare integers are not registered as
+    sizes ('2 bolts') - numbered sizes need a '#' ('#10'). A sheet standard that names one of
+    standard_names (the app's own names) without its edition year resolves to that name.
+    """
+    vocabulary = {}
+    app_standards = {normalize_entity_text(name).replace('-', ' '): name for name in standard_names}
+    
+    def add(phrase, entity_type, value):
+        phrase = normalize_entity_text(phrase)
+        if phrase and (entity_type, value) not in vocabulary.setdefault(phrase, []):
+            vocabulary[phrase].append((entity_type, value))
+    
+    def add_standard(standard):
+        standard = str(standard).strip()
+        base = STANDARD_EDITION_PATTERN.sub('', standard)
+        canonical = app_standards.get(normalize_entity_text(base).replace('-', ' '), standard)
+        for form in dict.fromkeys((standard, base)):
+            for variant in {form, form.replace('-', ' '), form.replace(' ', '-'), form.split('/')[0]}:
+                add(variant, 'standard', canonical)
+    
+    for name in standard_names:
+        add_standard(name)
+    
+    for entity_type, keyword_map in (('property', ENTITY_PROPERTY_KEYWORDS), ('material', ENTITY_MATERIAL_KEYWORDS),
+                                     ('value_type', ENTITY_VALUE_TYPE_KEYWORDS)):
+        for value, keywords in keyword_map.items():
+            for keyword in keywords:
+                add(keyword, entity_type, value)
+    
+    for frame in product_frames:
+        if frame is None or frame.empty:
+            continue
+        for column, entity_type in (('Product', 'product'), ('Standards', 'standard'), ('Size', 'size')):
+            if column not in frame.columns:
+                continue
+            for value in frame[column].dropna().astype(str).str.strip().unique():
+                if entity_type == 'product':
+                    add(value, 'product', value)
+                    add(value[:-1] if value.endswith('s') else value + 's', 'product', value)
+                elif entity_type == 'standard':
+                    add_standard(value)
+                elif value.isdigit():
+                    add(f"#{value}", 'size', f"#{value}")
+                else:
+                    add(value, 'size', value)
+                    add(value.replace('-', ' '), 'size', value)
+                    # 'M10 X 1.5' is also asked for as plain 'M10'
+                    metric_size = re.match(r'(M\d+(?:\.\d+)?)\s*X', value, re.IGNORECASE)
+                    if metric_size:
+                        add(metric_size.group(1), 'size', metric_size.group(1).upper())
+    
+    grades = list(grade_names)
+    if mechem_df is not None and not mechem_df.empty:
+        if 'Standard' in mechem_df.columns:
+            for standard in mechem_df['Standard'].dropna().astype(str).unique():
+                add_standard(standard)
+        if 'Property Class' in mechem_df.columns:
+            grades.extend(mechem_df['Property Class'].dropna().astype(str).str.strip().unique())
+    for grade in dict.fromkeys(grades):
+        grade_key = normalize_property_class(grade)
+        value = f"Grade {grade_key}" if grade_key.isdigit() and len(grade_key) == 1 else grade_key
+        for phrase in (f"grade {grade_key}", f"class {grade_key}", f"{grade_key} grade"):
+            add(phrase, 'grade', value)
+        # Bare '8.8', 'B7', '316' are unambiguous - bare 'A' or '5' are not
+        if not grade_key.isalpha() and not (grade_key.isdigit() and len(grade_key) < 3):
+            add(grade_key, 'grade', value)
+        if grade_key in STAINLESS_GRADES:
+            add(f"stainless {grade_key}", 'material', 'stainless steel')
+            add(f"stainless {grade_key}", 'grade', value)
+    
+    for thread_df in thread_frames:
+        if thread_df is None or thread_df.empty or 'Thread' not in thread_df.columns:
+            continue
+        threads = thread_df['Thread'].dropna().astype(str).str.strip()
+        for thread in threads.unique():
+            add(thread, 'thread', normalize_entity_text(thread).upper())
+        if 'Designation' in thread_df.columns:
+            for thread, designation in thread_df[['Thread', 'Designation']].dropna().astype(str).drop_duplicates().values:
+                add(f"{thread.strip()} {designation.strip()}", 'thread', f"{thread.strip()} {designation.strip()}")
+    return vocabulary
+
+def thread_nominal_size(thread):
+    """Nominal size of a thread designation - 'M10X1.5' -> 'M10', '1/2-13 UNC' -> '1/2', '10-24' -> '#10'"""
+    match = THREAD_SIZE_PATTERN.match(normalize_entity_text(thread))
+    if not match:
+        return None
+    size, pitch = match.groups()
+    if size.isdigit() and pitch and float(pitch) >= NUMBERED_SIZE_MIN_TPI:
+        return f"#{size}"
+    return size.upper()
+
+class CatalogEntityMatcher:
+    """All catalog entities of a query in one left-to-right pass of a single compiled trie regex"""
+    
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+        pattern = _trie_pattern(sorted(vocabulary)) if vocabulary else r'(?!x)x'
+        # Phrases only match as whole tokens - '8.8' not inside '18.8', 'min' not inside 'mining'
+        self.pattern = re.compile(rf'(?<![a-z0-9])({pattern})(?![a-z0-9])')
+    
+    def matches(self, query):
+        """(entity type, value) of every match in query order"""
+        found = []
+        for match in self.pattern.finditer(normalize_entity_text(query)):
+            found.extend(self.vocabulary[match.group(1)])
+        return found
+    
+    def extract(self, query):
+        """First value of each entity type, plus every match under 'matches'"""
+        found = self.matches(query)
+        entities = {entity_type: None for entity_type in
+                    ('property', 'material', 'grade', 'size', 'value_type', 'product', 'standard', 'thread')}
+        for entity_type, value in found:
+            if entities.get(entity_type) is None:
+                entities[entity_type] = value
+        # The longest match swallows the size of '1/2-13 heavy hex bolt' - recover it from the thread
+        if entities['size'] is None and entities['thread'] is not None:
+            entities['size'] = thread_nominal_size(entities['thread'])
+        entities['matches'] = found
+        return entities
+
+# ======================================================
+# PERSISTENT ANSWER CACHE
+# ======================================================
+ANSWER_CACHE_MAX_ENTRIES = 5000
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 3600
+# Replies that describe a degraded state are never cached
+ASSISTANT_TIMEOUT_MESSAGE = "The assistant is taking too long to answer - please try again."
+ASSISTANT_ERROR_MESSAGE = "Sorry, I could not answer that"
+# Only answers computed from catalog data are reused - fallbacks and degraded replies are not
+CACHEABLE_ANSWER_ROUTES = frozenset({"fast_path", "extractive_qa", "technical"})
+UNCACHEABLE_ANSWER_MARKERS = (ASSISTANT_TIMEOUT_MESSAGE, ASSISTANT_ERROR_MESSAGE)
+
+def normalize_query(query):
+    """Cache key text - case, spacing and trailing punctuation ignored"""
+    return re.sub(r'\s+', ' ', str(query).lower()).strip().rstrip('?.! ')
+
+class AnswerCache:
+    """SQLite answer store keyed by (normalized query, answer scope) with TTL and LRU eviction
+    
+    The scope combines catalog version, inference backend and whether models are loaded,
+    so an answer produced in degraded mode is never served once models are available.
+    """
+    
+    def __init__(self, path, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl_seconds=ANSWER_CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except sqlite3.Error:
+            self.path = ":memory:"
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            # Legacy table keyed by catalog version only - its entries may hold degraded-mode replies
+            self._conn.execute("DROP TABLE IF EXISTS answers")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS scoped_answers (
+                    query_key TEXT NOT NULL,
+                    scope TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    helpful_count INTEGER NOT NULL DEFAULT 0,
+                    total_uses INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (query_key, scope)
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS scoped_answers_last_used ON scoped_answers (last_used)")
+    
+    def get(self, query, scope):
+        """Cached response or None - expired entries count as misses"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM scoped_answers WHERE query_key = ? AND scope = ?",
+                (normalize_query(query), str(scope or ''))).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE scoped_answers SET last_used = ? WHERE query_key = ? AND scope = ?",
+                                   (now, normalize_query(query), str(scope or '')))
+            self.hits += 1
+            return row[0]
+    
+    def record(self, query, scope, response, was_helpful=True):
+        """Store or update an interaction - only helpful answers are kept for reuse"""
+        now = time.time()
+        key = normalize_query(query)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO scoped_answers (query_key, scope, response, helpful_count, total_uses, created_at, last_used)
+                VALUES (?, ?, ?, ?, 1, ?, ?)
+                ON CONFLICT (query_key, scope) DO UPDATE SET
+                    helpful_count = helpful_count + excluded.helpful_count,
+                    total_uses = total_uses + 1,
+                    last_used = excluded.last_used""",
+                (key, str(scope or ''), response, int(was_helpful), now, now))
+            if not was_helpful:
+                self._conn.execute("DELETE FROM scoped_answers WHERE query_key = ? AND scope = ? AND helpful_count = 0",
+                                   (key, str(scope or '')))
+            self._evict(now)
+    
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM scoped_answers WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute("""
+            DELETE FROM scoped_answers WHERE rowid IN (
+                SELECT rowid FROM scoped_answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)""", (self.max_entries,))
+    
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM scoped_answers")
+    
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM scoped_answers").fetchone()[0]
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'entries': entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'path': self.path,
+        }
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache():
+    """Single answer cache per process"""
+    return AnswerCache(answer_cache_path)
+
+class AdvancedFastenerAI:
+    def __init__(self, df, df_iso4014, df_mechem, thread_files, df_din7991=None, df_asme_b18_3=None, catalog_version=None):
+        self.df = df
+        self.df_iso4014 = df_iso4014
+        self.df_mechem = df_mechem
+        self.df_din7991 = df_din7991
+        self.df_asme_b18_3 = df_asme_b18_3
+        self.thread_files = thread_files
+        self.catalog_version = catalog_version
+        
+        # Load state lives on the instance - the instance is shared by every session
+        self.models_loaded = False
+        self.load_issues = []
+        self.backend = AI_BACKEND if AI_BACKEND in AI_BACKENDS else "torch"
+        
+        try:
+            self.sentence_model, self.qa_pipeline = load_assistant_models(self.backend)
+            self.models_loaded = True
+        except Exception as e:
+            self.load_issues.append(f"AI models loading issue ({self.backend}): {str(e)}")
+            if self.backend != "torch":
+                # ONNX backend unavailable - fall back to the torch models
+                try:
+                    self.backend = "torch"
+                    self.sentence_model, self.qa_pipeline = load_assistant_models("torch")
+                    self.models_loaded = True
+                except Exception as torch_error:
+                    self.load_issues.append(f"AI models loading issue (torch): {str(torch_error)}")
+        
+        # Query-time inference from every session goes through these shared queues
+        self.embedding_queue = embedding_batcher(self.sentence_model) if self.models_loaded else None
+        self.qa_queue = qa_batcher(self.qa_pipeline) if self.models_loaded else None
+        
+        # Parsed ME&CERT grades - the structured fast path and the knowledge base read from it
+        self.grade_knowledge = get_grade_knowledge(self.catalog_version)
         self.knowledge_base = self._build_knowledge_base()
-        self.learning_memory = {}
+        self.index_stats = {}
+        self.retriever = None
+        self.retrieval_latency = RetrievalLatency()
+        self._index_embeddings = None
+        self.learning_memory = get_answer_cache()
+        self.answer_scope = f"{self.catalog_version}|{self.backend}|{'models' if self.models_loaded else 'basic'}"
         self.conversation_history = []
         
-        self._index_database_content()
+        # Row texts first - the content hash tells whether the on-disk collection is already current
+        start_time = time.perf_counter()
+        self.index_documents = self._collect_index_documents()
+        self.embedding_id = f"{EMBEDDING_MODEL_NAME}:{'torch' if self.backend == 'onnx' else self.backend}"
+        self.content_hash = hash_index_documents(self.index_documents['ids'], self.index_documents['documents'],
+                                                 self.embedding_id)
+        text_ms = (time.perf_counter() - start_time) * 1000
+        
+        self.collection = None
+        self.index_persistent = False
+        try:
+            self.chroma_client, self.index_persistent = open_vector_client()
+            self.collection = self._open_collection()
+        except Exception as e:
+            self.load_issues.append(f"Vector index issue: {str(e)}")
+        
+        # An on-disk collection for the same content is reopened as-is, otherwise only changed rows are synced
+        indexed_rows = len(self.index_documents['ids'])
+        if (self.collection is not None and indexed_rows and self.collection.count() == indexed_rows
+                and (self.collection.metadata or {}).get("content_hash") == self.content_hash):
+            self.index_stats = {
+                'rows': indexed_rows,
+                'sources': self.index_documents['source_rows'],
+                'reopened': True,
+                'added': 0,
+                'updated': 0,
+                'deleted': 0,
+                'text_ms': text_ms,
+                'embed_ms': 0.0,
+                'add_ms': 0.0,
+                'total_ms': (time.perf_counter() - start_time) * 1000,
+            }
+        else:
+            self._index_database_content(text_ms)
+        
+        self.retriever = self._build_retriever()
+        
+        # Lexical index needs no models - built from the same row texts
+        self.lexical_index = BM25Index(self.index_documents['ids'], self.index_documents['documents'],
+                                       self.index_documents['metadatas'])
+        # Counters are bumped from every session's worker thread - updates and reads hold the lock
+        self.retrieval_modes = {'lexical': 0, 'hybrid': 0, 'semantic': 0}
+        self.route_counts = {'answer_cache': 0, 'fast_path': 0, 'full': 0}
+        self._counter_lock = threading.Lock()
+        
+        self.entity_matcher = CatalogEntityMatcher(build_entity_vocabulary(
+            [self.df, self.df_iso4014, self.df_din7991, self.df_asme_b18_3], self.df_mechem,
+            self._thread_frames(), ENTITY_EXTRA_GRADES, list(standard_series)
+        ))
+        self.source_frames = {source: data_df for source, _, data_df in self._index_sources() if data_df is not None}
+    
+    def _thread_frames(self):
+        """Thread sheets for the entity vocabulary - sheets that fail to load are skipped"""
+        frames = []
+        for standard_name in self.thread_files:
+            try:
+                frames.append(load_thread_data_enhanced(standard_name))
+            except Exception as e:
+                self.load_issues.append(f"Thread vocabulary for {standard_name} unavailable: {str(e)}")
+        return frames
+    
+    def _build_retriever(self):
+        """Dense matrix search for small corpora, the vector DB above DENSE_RETRIEVAL_MAX_ROWS"""
+        if not self.models_loaded or self.collection is None:
+            return None
+        
+        ids = self.index_documents['ids']
+        if not ids or len(ids) > DENSE_RETRIEVAL_MAX_ROWS:
+            return ChromaRetriever(self.collection)
+        
+        try:
+            embeddings = self._index_embeddings
+            if embeddings is None:
+                # Reopened index - read the stored embeddings back in index order
+                stored = self.collection.get(ids=ids, include=["embeddings"])
+                by_id = dict(zip(stored['ids'], stored['embeddings']))
+                embeddings = np.asarray([by_id[doc_id] for doc_id in ids], dtype=np.float32)
+            return DenseMatrixRetriever(embeddings, ids, self.index_documents['documents'],
+                                        self.index_documents['metadatas'], use_float16=DENSE_RETRIEVAL_FLOAT16)
+        except Exception as e:
+            self.load_issues.append(f"Dense retrieval unavailable, using the vector DB: {str(e)}")
+            return ChromaRetriever(self.collection)
+        finally:
+            self._index_embeddings = None
+    
+    def _open_collection(self):
+        """One collection per embedding model - collections of other embedders are dropped.
+        
+        Catalog edits are applied to it row by row (see _index_database_content), so it is not
+        rebuilt when the data changes.
+        """
+        embedding_key = hashlib.sha256(self.embedding_id.encode('utf-8')).hexdigest()[:16]
+        collection_name = f"{INDEX_COLLECTION_PREFIX}_{embedding_key}"
+        for existing in self.chroma_client.list_collections():
+            existing_name = getattr(existing, 'name', existing)
+            if existing_name.startswith(INDEX_COLLECTION_PREFIX) and existing_name != collection_name:
+                self.chroma_client.delete_collection(existing_name)
+        
+        return self.chroma_client.get_or_create_collection(
+            name=collection_name,
+            metadata={"embedding_model": self.embedding_id}
+        )
     
     def _build_knowledge_base(self):
         """Build comprehensive fastener knowledge base"""
@@ -2526,35 +4758,8 @@ class AdvancedFastenerAI:
                 'alloy_steel': "Steel with additional alloying elements like chromium, nickel, molybdenum for enhanced properties",
                 'brass': "Copper-zinc alloy with good corrosion resistance and electrical conductivity",
             },
-            'grade_properties': {
-                'Grade 2': {
-                    'description': 'Low carbon steel for general purpose applications',
-                    'chemistry': 'C: 0.05-0.31%, Mn: 0.90% max, P: 0.04% max, S: 0.05% max',
-                    'mechanical': 'Tensile: 74,000 psi min, Yield: 57,000 psi min',
-                    'hardness': 'RB 70-100',
-                    'applications': 'General purpose, low stress applications'
-                },
-                'Grade 5': {
-                    'description': 'Medium carbon steel, quenched and tempered',
-                    'chemistry': 'C: 0.28-0.55%, Mn: 0.60% max, P: 0.04% max, S: 0.05% max',
-                    'mechanical': 'Tensile: 120,000 psi min, Yield: 92,000 psi min',
-                    'hardness': 'RC 25-34',
-                    'applications': 'Automotive, machinery, construction'
-                },
-                'Grade 8': {
-                    'description': 'Medium carbon alloy steel, quenched and tempered',
-                    'chemistry': 'C: 0.36-0.55%, Mn: 0.90% max, P: 0.04% max, S: 0.05% max',
-                    'mechanical': 'Tensile: 150,000 psi min, Yield: 130,000 psi min',
-                    'hardness': 'RC 33-39',
-                    'applications': 'High-strength applications, automotive suspension'
-                },
-                'Stainless 304': {
-                    'description': 'Austenitic stainless steel, excellent corrosion resistance',
-                    'chemistry': 'C: 0.08% max, Cr: 18-20%, Ni: 8-10.5%',
-                    'mechanical': 'Tensile: 75,000 psi min, Yield: 30,000 psi min',
-                    'applications': 'Corrosive environments, food processing'
-                }
-            },
+            # Built-in SAE grades first - sheet grades override any overlap
+            'grade_properties': {**SAE_J429_GRADES, **self.grade_knowledge.grade_properties()},
             'column_mappings': {
                 'carbon': ['C%', 'Carbon', 'Carbon Content', 'C'],
                 'manganese': ['Mn%', 'Manganese', 'Mn Content'],
@@ -2567,132 +4772,224 @@ class AdvancedFastenerAI:
             }
         }
     
-    def _index_database_content(self):
-        """Index all database content for semantic search"""
-        if not st.session_state.ai_model_loaded:
+    def _index_sources(self):
+        """(source, id prefix, dataframe) for every indexed database"""
+        return [
+            ("main_db", "main", self.df),
+            ("iso_db", "iso", self.df_iso4014),
+            ("mecert_db", "mecert", self.df_mechem),
+            ("din7991_db", "din7991", self.df_din7991),
+            ("asme_b18_3_db", "asme_b18_3", self.df_asme_b18_3),
+        ]
+    
+    def _collect_index_documents(self):
+        """Row texts, metadata and ids of every indexed database.
+        
+        Ids come from the row's content hash (plus an occurrence number for identical rows),
+        so an edited row gets a new id while moved rows keep theirs.
+        """
+        documents, metadatas, ids = [], [], []
+        source_rows = {}
+        for source, prefix, data_df in self._index_sources():
+            if data_df is None or data_df.empty:
+                continue
+            row_texts = build_row_texts(data_df)
+            occurrences = {}
+            for idx, text in row_texts.items():
+                row_hash = hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+                occurrence = occurrences.get(row_hash, 0)
+                occurrences[row_hash] = occurrence + 1
+                documents.append(text)
+                metadatas.append({"source": source, "row_index": int(idx), "row_hash": row_hash})
+                ids.append(f"{prefix}_{row_hash}_{occurrence}")
+            source_rows[source] = len(row_texts)
+        return {'documents': documents, 'metadatas': metadatas, 'ids': ids, 'source_rows': source_rows}
+    
+    def _index_database_content(self, text_ms=0.0):
+        """Sync the collection with the current rows - only added or changed rows are embedded.
+        
+        Rows whose id is no longer present are deleted, rows that only moved get a metadata update.
+        """
+        if not self.models_loaded or self.collection is None:
             return
             
         try:
-            if not self.df.empty:
-                for idx, row in self.df.iterrows():
-                    text_content = " ".join([str(val) for val in row.values if pd.notna(val)])
-                    self.collection.add(
-                        documents=[text_content],
-                        metadatas=[{"source": "main_db", "row_index": idx}],
-                        ids=[f"main_{idx}"]
-                    )
+            documents = self.index_documents['documents']
+            metadatas = self.index_documents['metadatas']
+            ids = self.index_documents['ids']
             
-            if not self.df_iso4014.empty:
-                for idx, row in self.df_iso4014.iterrows():
-                    text_content = " ".join([str(val) for val in row.values if pd.notna(val)])
-                    self.collection.add(
-                        documents=[text_content],
-                        metadatas=[{"source": "iso_db", "row_index": idx}],
-                        ids=[f"iso_{idx}"]
-                    )
+            start_time = time.perf_counter()
+            stored = self.collection.get(include=["metadatas"]) if self.collection.count() else {'ids': [], 'metadatas': []}
+            stored_metadata = dict(zip(stored['ids'], stored['metadatas']))
+            wanted = set(ids)
             
-            if not self.df_mechem.empty:
-                for idx, row in self.df_mechem.iterrows():
-                    text_content = " ".join([str(val) for val in row.values if pd.notna(val)])
-                    self.collection.add(
-                        documents=[text_content],
-                        metadatas=[{"source": "mecert_db", "row_index": idx}],
-                        ids=[f"mecert_{idx}"]
-                    )
+            deleted_ids = [doc_id for doc_id in stored_metadata if doc_id not in wanted]
+            new_positions = [pos for pos, doc_id in enumerate(ids) if doc_id not in stored_metadata]
+            moved_positions = [pos for pos, doc_id in enumerate(ids)
+                               if doc_id in stored_metadata and stored_metadata[doc_id] != metadatas[pos]]
+            diff_time = time.perf_counter()
             
-            if self.df_din7991 is not None and not self.df_din7991.empty:
-                for idx, row in self.df_din7991.iterrows():
-                    text_content = " ".join([str(val) for val in row.values if pd.notna(val)])
-                    self.collection.add(
-                        documents=[text_content],
-                        metadatas=[{"source": "din7991_db", "row_index": idx}],
-                        ids=[f"din7991_{idx}"]
-                    )
+            if new_positions:
+                new_embeddings = self.sentence_model.encode([documents[pos] for pos in new_positions],
+                                                            batch_size=INDEX_ENCODE_BATCH_SIZE,
+                                                            convert_to_numpy=True, show_progress_bar=False)
+            embed_time = time.perf_counter()
             
-            if self.df_asme_b18_3 is not None and not self.df_asme_b18_3.empty:
-                for idx, row in self.df_asme_b18_3.iterrows():
-                    text_content = " ".join([str(val) for val in row.values if pd.notna(val)])
-                    self.collection.add(
-                        documents=[text_content],
-                        metadatas=[{"source": "asme_b18_3_db", "row_index": idx}],
-                        ids=[f"asme_b18_3_{idx}"]
-                    )
+            for chunk_start in range(0, len(deleted_ids), INDEX_ADD_BATCH_SIZE):
+                self.collection.delete(ids=deleted_ids[chunk_start:chunk_start + INDEX_ADD_BATCH_SIZE])
+            for chunk_start in range(0, len(new_positions), INDEX_ADD_BATCH_SIZE):
+                chunk = new_positions[chunk_start:chunk_start + INDEX_ADD_BATCH_SIZE]
+                self.collection.upsert(
+                    documents=[documents[pos] for pos in chunk],
+                    embeddings=new_embeddings[chunk_start:chunk_start + len(chunk)].tolist(),
+                    metadatas=[metadatas[pos] for pos in chunk],
+                    ids=[ids[pos] for pos in chunk]
+                )
+            for chunk_start in range(0, len(moved_positions), INDEX_ADD_BATCH_SIZE):
+                chunk = moved_positions[chunk_start:chunk_start + INDEX_ADD_BATCH_SIZE]
+                self.collection.update(ids=[ids[pos] for pos in chunk], metadatas=[metadatas[pos] for pos in chunk])
+            
+            # Record the content the collection now holds - an unchanged catalog reopens without diffing
+            self.collection.modify(metadata={"embedding_model": self.embedding_id, "content_hash": self.content_hash})
+            end_time = time.perf_counter()
+            
+            # A full build already has every embedding in memory for the dense retriever
+            if new_positions and len(new_positions) == len(ids):
+                self._index_embeddings = new_embeddings
+            
+            self.index_stats = {
+                'rows': len(documents),
+                'sources': self.index_documents['source_rows'],
+                'reopened': False,
+                'added': len(new_positions),
+                'updated': len(moved_positions),
+                'deleted': len(deleted_ids),
+                'text_ms': text_ms + (diff_time - start_time) * 1000,
+                'embed_ms': (embed_time - diff_time) * 1000,
+                'add_ms': (end_time - embed_time) * 1000,
+                'total_ms': text_ms + (end_time - start_time) * 1000,
+            }
         except Exception as e:
-            st.warning(f"Database indexing issue: {str(e)}")
+            self.load_issues.append(f"Database indexing issue: {str(e)}")
+    
+    def benchmark_retrieval(self, queries, n_results=5):
+        """Run the same queries through the dense matrix and the vector DB - latencies go to retrieval_latency.
+        
+        Returns the mean top-k id overlap between the two backends.
+        """
+        if not self.models_loaded or self.collection is None or self.retriever is None:
+            return None
+        
+        chroma_retriever = ChromaRetriever(self.collection)
+        if isinstance(self.retriever, DenseMatrixRetriever):
+            dense_retriever = self.retriever
+        else:
+            stored = self.collection.get(include=["embeddings", "documents", "metadatas"])
+            dense_retriever = DenseMatrixRetriever(stored['embeddings'], stored['ids'], stored['documents'],
+                                                   stored['metadatas'], use_float16=DENSE_RETRIEVAL_FLOAT16)
+        
+        query_embeddings = self.sentence_model.encode(list(queries), convert_to_numpy=True, show_progress_bar=False)
+        overlaps = []
+        for query_embedding in query_embeddings:
+            top_ids = []
+            for retriever in (dense_retriever, chroma_retriever):
+                start_time = time.perf_counter()
+                results = retriever.query(query_embedding, n_results)
+                self.retrieval_latency.record(retriever.name, (time.perf_counter() - start_time) * 1000)
+                top_ids.append(set(results['ids'][0]))
+            overlaps.append(len(top_ids[0] & top_ids[1]) / max(len(top_ids[0]), 1))
+        return float(np.mean(overlaps)) if overlaps else None
     
     def _semantic_search(self, query, n_results=5):
         """Perform semantic search on database content"""
-        if not st.session_state.ai_model_loaded or self.collection is None:
+        if not self.models_loaded or self.retriever is None:
             return []
             
         try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
-            )
+            # The index holds sentence_model embeddings, so queries are embedded the same way
+            query_embedding = self.embedding_queue(query)
+            start_time = time.perf_counter()
+            results = self.retriever.query(query_embedding, n_results)
+            self.retrieval_latency.record(self.retriever.name, (time.perf_counter() - start_time) * 1000)
             return results
         except:
             return []
     
-    def _extract_entities_advanced(self, query):
-        """Advanced entity extraction using multiple methods"""
-        entities = {
-            'property': None,
-            'material': None,
-            'grade': None,
-            'size': None,
-            'value_type': None,
-        }
-        
-        query_lower = query.lower()
-        
-        property_keywords = {
-            'carbon': ['c%', 'carbon', 'carbon content'],
-            'tensile': ['tensile', 'ultimate strength', 'uts'],
-            'yield': ['yield', 'proof strength'],
-            'hardness': ['hardness', 'hrc', 'hrb', 'brinell'],
-            'elongation': ['elongation', 'ductility'],
-            'manganese': ['mn%', 'manganese'],
-            'phosphorus': ['p%', 'phosphorus'],
-            'sulfur': ['s%', 'sulfur'],
-        }
-        
-        for prop, keywords in property_keywords.items():
-            if any(keyword in query_lower for keyword in keywords):
-                entities['property'] = prop
-                break
+    def _hybrid_search(self, query, n_results=5):
+        """Lexical + semantic retrieval fused with reciprocal rank fusion.
+        
+        Short queries built around exact spec tokens (5/8-11, M12x1.25, B7, Grade 8) are answered
+        from the lexical index alone, without running the embedder.
+        """
+        query_tokens = tokenize_spec_text(query)
+        start_time = time.perf_counter()
+        lexical_top, lexical_scores = self.lexical_index.search(query_tokens, n_results * 4)
+        self.retrieval_latency.record(self.lexical_index.name, (time.perf_counter() - start_time) * 1000)
+        
+        content_tokens = [token for token in query_tokens if '_' not in token]
+        exact_query = (any(is_spec_token(token) for token in content_tokens)
+                       and len(content_tokens) <= EXACT_QUERY_MAX_TOKENS)
+        if lexical_top.size and (exact_query or self.retriever is None or not self.models_loaded):
+            self._count(self.retrieval_modes, 'lexical')
+            return self.lexical_index.to_results(lexical_top[:n_results], lexical_scores[:n_results])
+        
+        semantic_results = self._semantic_search(query, n_results * 4)
+        if not semantic_results:
+            if lexical_top.size:
+                self._count(self.retrieval_modes, 'lexical')
+                return self.lexical_index.to_results(lexical_top[:n_results], lexical_scores[:n_results])
+            return []
+        if not lexical_top.size:
+            self._count(self.retrieval_modes, 'semantic')
+            return {key: [values[0][:n_results]] for key, values in semantic_results.items() if values}
+        
+        self._count(self.retrieval_modes, 'hybrid')
+        lexical_ids = self.lexical_index.ids[lexical_top].tolist()
+        fused_ids = fuse_ranked_ids([lexical_ids, list(semantic_results['ids'][0])], n_results)
+        positions = self.lexical_index.positions
+        fused_indices = np.asarray([positions[doc_id] for doc_id in fused_ids if doc_id in positions], dtype=np.int64)
+        results = self.lexical_index.to_results(fused_indices, np.zeros(len(fused_indices)))
+        results['distances'] = [[float(rank) for rank in range(len(fused_indices))]]
+        return results
+    
+    def _extractive_answer(self, query, search_results):
+        """Answer span from the top retrieved rows - all candidates go through the QA model as one batch.
         
-        grade_patterns = [
-            r'grade\s+([2458]|B7|L7)',
-            r'([2458])\s+grade',
-            r'stainless\s+(304|316|410)',
-        ]
+        Returns answer lines with the citing row, or [] when no candidate is confident enough.
+        """
+        if not self.models_loaded or self.qa_queue is None or not search_results:
+            return []
         
-        for pattern in grade_patterns:
-            match = re.search(pattern, query_lower)
-            if match:
-                entities['grade'] = f"Grade {match.group(1)}" if match.group(1).isdigit() else match.group(1)
-                break
+        start_time = time.perf_counter()
+        tokenizer = getattr(self.qa_pipeline, 'tokenizer', None)
+        candidates = []
+        for metadata in search_results['metadatas'][0][:QA_TOP_K]:
+            data_df = self.source_frames.get(metadata.get('source'))
+            if data_df is None or metadata.get('row_index') not in data_df.index:
+                continue
+            context = truncate_to_token_budget(tokenizer, row_context_text(data_df.loc[metadata['row_index']]))
+            candidates.append((metadata, context))
+        if not candidates:
+            return []
         
-        if 'stainless' in query_lower:
-            entities['material'] = 'stainless steel'
-        elif 'carbon' in query_lower and 'steel' in query_lower:
-            entities['material'] = 'carbon steel'
-        elif 'alloy' in query_lower:
-            entities['material'] = 'alloy steel'
-        elif 'brass' in query_lower:
-            entities['material'] = 'brass'
-        
-        if 'minimum' in query_lower or 'min' in query_lower:
-            entities['value_type'] = 'min'
-        elif 'maximum' in query_lower or 'max' in query_lower:
-            entities['value_type'] = 'max'
-        elif 'typical' in query_lower or 'average' in query_lower:
-            entities['value_type'] = 'typical'
-        elif 'range' in query_lower:
-            entities['value_type'] = 'range'
+        # Submitted together, so the shared queue runs them in one forward pass
+        futures = [self.qa_queue.submit((query, context)) for _, context in candidates]
+        answers = [future.result(timeout=INFERENCE_REQUEST_TIMEOUT) for future in futures]
+        self.retrieval_latency.record("extractive-qa", (time.perf_counter() - start_time) * 1000)
         
-        return entities
+        best = max(range(len(answers)), key=lambda position: answers[position]['score'])
+        answer, (metadata, _) = answers[best], candidates[best]
+        if answer['score'] < QA_MIN_SCORE or not answer['answer'].strip():
+            return []
+        source_label = INDEX_SOURCE_LABELS.get(metadata['source'], metadata['source'])
+        return [
+            f"**From the catalog:** {answer['answer'].strip()}",
+            f"Source: {source_label} database, row {metadata['row_index'] + 1} (confidence {answer['score']:.0%})",
+        ]
+    
+    def _extract_entities_advanced(self, query):
+        """Catalog entities (property, grade, size, product, standard, thread, ...) in one pass over the query"""
+        return self.entity_matcher.extract(query)
     
     def _search_database_for_property(self, entities):
         """Search database for specific properties"""
@@ -2746,12 +5043,13 @@ class AdvancedFastenerAI:
                 grade_info = self.knowledge_base['grade_properties'][grade]
                 response_parts.append(f"**{grade} Mechanical Properties:**")
                 
-                if prop_name == 'tensile':
-                    response_parts.append(f"Tensile Strength: {grade_info.get('mechanical', '').split(',')[0]}")
-                elif prop_name == 'yield':
-                    mech_parts = grade_info.get('mechanical', '').split(',')
-                    if len(mech_parts) > 1:
-                        response_parts.append(f"Yield Strength: {mech_parts[1]}")
+                if prop_name in ('tensile', 'yield'):
+                    # 'Tensile: 150,000 psi min, Yield: 130,000 psi min' - each fragment carries its own label
+                    mech_parts = dict(part.split(': ', 1) for part in grade_info.get('mechanical', '').split(', ')
+                                      if ': ' in part)
+                    value = mech_parts.get(prop_name.title())
+                    if value:
+                        response_parts.append(f"{prop_name.title()} Strength: {value}")
                 elif prop_name == 'hardness':
                     response_parts.append(f"Hardness: {grade_info.get('hardness', 'N/A')}")
                 
@@ -2759,24 +5057,86 @@ class AdvancedFastenerAI:
         
         return response_parts
     
+    def _answer_structured(self, entities):
+        """Answer a fully specified property + grade question straight from the tables, or None"""
+        prop, grade = entities.get('property'), entities.get('grade')
+        if not prop or not grade:
+            return None
+        
+        entry = self.grade_knowledge.lookup(grade)
+        if entry is not None and prop in entry['answers']:
+            return entry['answers'][prop]
+        
+        # Grades outside the sheet come from the built-in grade table
+        if grade in self.knowledge_base['grade_properties']:
+            technical_answer = self._get_technical_answer("", entities)
+            if technical_answer:
+                return "\n".join(technical_answer)
+        return None
+    
+    def _count(self, counter, key):
+        with self._counter_lock:
+            counter[key] += 1
+    
+    def counter_snapshot(self):
+        """Copies of the route and retrieval-mode counters, read under the lock"""
+        with self._counter_lock:
+            return dict(self.route_counts), dict(self.retrieval_modes)
+    
     def process_complex_query(self, query):
         """Process complex technical queries with advanced reasoning"""
-        if not st.session_state.ai_model_loaded:
-            return "AI capabilities are currently limited. Please ensure all required models are installed."
+        return "\n".join(self.iter_complex_query(query))
+    
+    def iter_complex_query(self, query):
+        """Answer lines in the order they are produced - cached answers, then table answers, retrieval last
+        
+        The generator's return value names the route that produced the answer.
+        """
+        start_time = time.perf_counter()
+        cached_answer = self.learning_memory.get(query, self.answer_scope)
+        if cached_answer is not None:
+            self._count(self.route_counts, 'answer_cache')
+            yield from cached_answer.split("\n")
+            return "answer_cache"
         
         entities = self._extract_entities_advanced(query)
         
-        semantic_results = self._semantic_search(query)
+        # Fully specified property + grade questions skip retrieval and model inference
+        structured_answer = self._answer_structured(entities)
+        if structured_answer:
+            self._count(self.route_counts, 'fast_path')
+            yield from structured_answer.split("\n")
+            return "fast_path"
+        
+        if not self.models_loaded:
+            yield "AI capabilities are currently limited. Please ensure all required models are installed."
+            return "limited"
+        
+        self._count(self.route_counts, 'full')
         
         response_parts = []
+        route = None
         
         technical_answer = self._get_technical_answer(query, entities)
         if technical_answer:
             response_parts.extend(technical_answer)
+            route = "technical"
+            yield from technical_answer
+        
+        semantic_results = self._hybrid_search(query)
+        extracted_answer = self._extractive_answer(query, semantic_results)
+        if extracted_answer:
+            if response_parts:
+                extracted_answer = [""] + extracted_answer
+            response_parts.extend(extracted_answer)
+            route = "extractive_qa"
+            yield from extracted_answer
         
         db_results = self._search_database_for_property(entities)
         if db_results:
             response_parts.extend([""] + db_results)
+            route = route or "database"
+            yield from [""] + db_results
         
         if not response_parts:
             query_lower = query.lower()
@@ -2785,9 +5145,11 @@ class AdvancedFastenerAI:
                 for term, definition in self.knowledge_base['technical_terms'].items():
                     if term in query_lower:
                         response_parts.append(f"**{term.title()}:** {definition}")
+                        route = "definition"
                         break
             
             if not response_parts:
+                route = "fallback"
                 response_parts.append("I understand you're asking about fastener properties. ")
                 response_parts.append("I can help with:")
                 response_parts.append("• Chemical composition (C%, Mn%, P%, S%)")
@@ -2795,26 +5157,28 @@ class AdvancedFastenerAI:
                 response_parts.append("• Material grades and their specifications")
                 response_parts.append("• Database queries and calculations")
                 response_parts.append("\nTry asking: 'What is the carbon content in Grade 5?' or 'Show me tensile strength data'")
+            
+            yield from response_parts
         
-        return "\n".join(response_parts)
+        self.retrieval_latency.record("end-to-end", (time.perf_counter() - start_time) * 1000)
+        return route
     
-    def learn_from_interaction(self, query, response, was_helpful=True):
-        """Learn from user interactions to improve future responses"""
-        interaction_key = query.lower().strip()
-        
-        if interaction_key not in self.learning_memory:
-            self.learning_memory[interaction_key] = {
-                'response': response,
-                'helpful_count': 0,
-                'total_uses': 0,
-                'last_used': datetime.now().isoformat()
-            }
+    def learn_from_interaction(self, query, response, route, was_helpful=True):
+        """Learn from user interactions to improve future responses - persisted in the answer cache
         
-        self.learning_memory[interaction_key]['total_uses'] += 1
-        if was_helpful:
-            self.learning_memory[interaction_key]['helpful_count'] += 1
-        
-        self.learning_memory[interaction_key]['last_used'] = datetime.now().isoformat()
+        Only answers from a real data route are stored; timeouts, errors and fallbacks never are.
+        """
+        if not response or route not in CACHEABLE_ANSWER_ROUTES:
+            return
+        if any(marker in response for marker in UNCACHEABLE_ANSWER_MARKERS):
+            return
+        self.learning_memory.record(query, self.answer_scope, response, was_helpful)
+
+@st.cache_resource(show_spinner="Loading AI models and indexing the catalog...", max_entries=1)
+def get_fastener_ai(catalog_version):
+    """Single AdvancedFastenerAI per process - models and vector index are rebuilt only when the catalog version changes"""
+    return AdvancedFastenerAI(df, df_iso4014, df_mechem, thread_files, df_din7991, df_asme_b18_3,
+                              catalog_version=catalog_version)
 
 # ======================================================
 # Enhanced Data Quality Indicators
@@ -2872,29 +5236,139 @@ def show_data_quality_indicators():
 # ======================================================
 # MESSENGER-STYLE CHAT INTERFACE WITH ADVANCED AI
 # ======================================================
+# Messages rendered per rerun - older ones are loaded a page at a time on request
+TRANSCRIPT_WINDOW = 20
+TRANSCRIPT_PAGE = 20
+TRANSCRIPT_RETENTION_SECONDS = 30 * 24 * 3600
+
+class TranscriptStore:
+    """SQLite chat transcripts keyed by (session id, message sequence) - windows are read newest first"""
+    
+    def __init__(self, path, retention_seconds=TRANSCRIPT_RETENTION_SECONDS):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except sqlite3.Error:
+            self.path = ":memory:"
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    time TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                )""")
+            # Transcripts of long-gone sessions are dropped at startup
+            self._conn.execute("DELETE FROM messages WHERE created_at < ?", (time.time() - retention_seconds,))
+    
+    def append(self, session_id, role, content, timestamp):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO messages (session_id, seq, role, content, time, created_at)
+                SELECT ?, COALESCE(MAX(seq), -1) + 1, ?, ?, ?, ? FROM messages WHERE session_id = ?""",
+                (session_id, role, content, timestamp, time.time(), session_id))
+    
+    def count(self, session_id):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+    
+    def window(self, session_id, limit):
+        """The last limit messages of a session, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, time FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, limit)).fetchall()
+        return [{'role': role, 'content': content, 'time': timestamp} for role, content, timestamp in reversed(rows)]
+    
+    def clear(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+@st.cache_resource(show_spinner=False)
+def get_transcript_store():
+    """Single transcript store per process"""
+    return TranscriptStore(transcript_store_path)
+
 def add_message(role, content):
     """Add message to chat history"""
     timestamp = datetime.now().strftime("%H:%M")
-    st.session_state.chat_messages.append({
-        'role': role,
-        'content': content,
-        'time': timestamp
-    })
+    get_transcript_store().append(st.session_state.chat_session_id, role, content, timestamp)
 
-def show_typing_indicator():
-    """Show typing indicator"""
-    st.markdown("""
-    <div class="typing-indicator">
-        <div class="typing-dot"></div>
-        <div class="typing-dot"></div>
-        <div class="typing-dot"></div>
-    </div>
-    """, unsafe_allow_html=True)
+def render_message_html(msg):
+    """Messenger bubble markup of one stored message - single line, so bubbles can be joined into one block"""
+    bubble_class = "user-message" if msg['role'] == 'user' else "ai-message"
+    formatted_content = msg['content'] if msg['role'] == 'user' else msg['content'].replace('\n', '<br>')
+    return (f'<div class="message {bubble_class}"><div>{formatted_content}</div>'
+            f'<div class="message-time">{msg["time"]}</div></div>')
+
+ASSISTANT_WORKERS = 4
+ASSISTANT_RESPONSE_TIMEOUT = 120
+
+@st.cache_resource(show_spinner=False)
+def get_assistant_executor():
+    """Background workers shared by all sessions - assistant queries never run on the script thread"""
+    return ThreadPoolExecutor(max_workers=ASSISTANT_WORKERS, thread_name_prefix="assistant")
+
+def stream_assistant_response(ai_assistant, query, outcome):
+    """Run the query on a background worker and yield answer lines as the worker produces them
+    
+    outcome['route'] is set to the answering route once the worker finishes in time.
+    """
+    chunks = queue.Queue()
+    
+    def work():
+        lines = ai_assistant.iter_complex_query(query)
+        route = None
+        try:
+            while True:
+                chunks.put(next(lines))
+        except StopIteration as done:
+            route = done.value
+        except Exception as e:
+            chunks.put(f"{ASSISTANT_ERROR_MESSAGE}: {str(e)}")
+        finally:
+            chunks.put((route,))
+    
+    get_assistant_executor().submit(work)
+    while True:
+        try:
+            line = chunks.get(timeout=ASSISTANT_RESPONSE_TIMEOUT)
+        except queue.Empty:
+            yield ASSISTANT_TIMEOUT_MESSAGE
+            return
+        if isinstance(line, tuple):
+            outcome['route'] = line[0]
+            return
+        # Markdown line break
+        yield line + "  \n"
 
 def show_chat_interface():
     """Show messenger-style chat interface with advanced AI"""
     
-    ai_assistant = AdvancedFastenerAI(df, df_iso4014, df_mechem, thread_files, df_din7991, df_asme_b18_3)
+    ai_assistant = get_fastener_ai(catalog_version)
+    st.session_state.ai_model_loaded = ai_assistant.models_loaded
+    for load_issue in ai_assistant.load_issues:
+        st.warning(load_issue)
+    if ai_assistant.index_stats:
+        index_stats = ai_assistant.index_stats
+        if index_stats['reopened']:
+            st.caption(
+                f"Knowledge index: {index_stats['rows']} rows reopened from disk in {index_stats['total_ms']:.0f} ms "
+                f"(content hash {ai_assistant.content_hash[:12]})"
+            )
+        else:
+            st.caption(
+                f"Knowledge index: {index_stats['rows']} rows from {len(index_stats['sources'])} databases synced in "
+                f"{index_stats['total_ms']:.0f} ms - {index_stats['added']} embedded, {index_stats['updated']} moved, "
+                f"{index_stats['deleted']} removed (text {index_stats['text_ms']:.0f} ms, "
+                f"embedding {index_stats['embed_ms']:.0f} ms, write {index_stats['add_ms']:.0f} ms)"
+                + ("" if ai_assistant.index_persistent else " - in-memory only")
+            )
     
     st.markdown("""
     <div class="engineering-header">
@@ -2916,6 +5390,46 @@ def show_chat_interface():
     else:
         st.warning("Basic AI Mode: Install transformers, sentence-transformers, chromadb for full capabilities")
     
+    with st.expander("AI library import report"):
+        import_report = pd.DataFrame(load_ml_stack()['report'])
+        st.dataframe(import_report, use_container_width=True, hide_index=True)
+        st.caption(f"Total import time: {import_report['import_ms'].sum():.0f} ms - these libraries are only loaded once the assistant is opened")
+    
+    with st.expander(f"Inference backend: {ai_assistant.backend}"):
+        st.caption("Set FASTENER_AI_BACKEND to torch, onnx or onnx-int8 to choose the CPU inference backend.")
+        if st.button("Benchmark backends", key="ai_backend_benchmark"):
+            sample_texts = ai_assistant.index_documents['documents'][:64] or ["Grade 8 hex bolt 1/2-13"]
+            with st.spinner("Benchmarking torch / ONNX / ONNX int8..."):
+                st.session_state.ai_backend_benchmark = benchmark_ai_backends(sample_texts)
+        if st.session_state.get('ai_backend_benchmark') is not None:
+            st.dataframe(st.session_state.ai_backend_benchmark, use_container_width=True, hide_index=True)
+
+        if ai_assistant.embedding_queue is not None:
+            st.caption(f"Shared inference queue: {INFERENCE_THREADS} inference threads (FASTENER_INFERENCE_THREADS), "
+                       f"{INFERENCE_BATCH_WINDOW_MS:g} ms batching window (FASTENER_BATCH_WINDOW_MS)")
+            st.dataframe(pd.DataFrame([ai_assistant.embedding_queue.stats(), ai_assistant.qa_queue.stats()]),
+                         use_container_width=True, hide_index=True)
+
+        if ai_assistant.retriever is not None:
+            st.caption(f"Semantic retrieval: {ai_assistant.retriever.name} "
+                       f"(dense matrix up to {DENSE_RETRIEVAL_MAX_ROWS} rows, FASTENER_DENSE_MAX_ROWS)")
+            routes, modes = ai_assistant.counter_snapshot()
+            st.caption(f"Query routing - answer cache: {routes['answer_cache']}, "
+                       f"answered from tables (fast path): {routes['fast_path']}, full retrieval: {routes['full']}")
+            cache_stats = ai_assistant.learning_memory.stats()
+            st.caption(f"Answer cache: {cache_stats['entries']} answers, hit rate {cache_stats['hit_rate']:.0%} "
+                       f"({cache_stats['hits']} hits / {cache_stats['misses']} misses)")
+            st.caption(f"Retrieval mode counts - lexical only: {modes['lexical']}, hybrid: {modes['hybrid']}, "
+                       f"semantic only: {modes['semantic']}")
+            if st.button("Compare retrieval backends", key="ai_retrieval_benchmark"):
+                overlap = ai_assistant.benchmark_retrieval(RETRIEVAL_BENCHMARK_QUERIES)
+                if overlap is not None:
+                    st.caption(f"Top-5 agreement between dense matrix and vector DB: {overlap:.0%}")
+            latency = ai_assistant.retrieval_latency.summary()
+            if not latency.empty:
+                st.caption("Latency by stage - retrieval backends, extractive QA over the top rows and end-to-end answers")
+                st.dataframe(latency, use_container_width=True, hide_index=True)
+    
     st.markdown("### Technical Questions")
     technical_questions = [
         "What is C% in Grade 5?",
@@ -2925,38 +5439,28 @@ def show_chat_interface():
         "Hardness specifications for alloy steels"
     ]
     
+    pending_query = None
     cols = st.columns(5)
     for idx, question in enumerate(technical_questions):
         with cols[idx]:
             if st.button(question, use_container_width=True, key=f"tech_{idx}"):
-                add_message("user", question)
-                st.session_state.ai_thinking = True
-                st.rerun()
+                pending_query = question
     
     st.markdown("### Advanced AI Chat")
-    st.markdown('<div class="chat-container">', unsafe_allow_html=True)
     
-    for msg in st.session_state.chat_messages:
-        if msg['role'] == 'user':
-            st.markdown(f"""
-            <div class="message user-message">
-                <div>{msg['content']}</div>
-                <div class="message-time">{msg['time']}</div>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            formatted_content = msg['content'].replace('\n', '<br>')
-            st.markdown(f"""
-            <div class="message ai-message">
-                <div>{formatted_content}</div>
-                <div class="message-time">{msg['time']}</div>
-            </div>
-            """, unsafe_allow_html=True)
-    
-    if st.session_state.ai_thinking:
-        show_typing_indicator()
+    # Only the newest window of the transcript is read and rendered, as a single markdown block
+    transcript_store = get_transcript_store()
+    session_id = st.session_state.chat_session_id
+    window_size = st.session_state.chat_window_size or TRANSCRIPT_WINDOW
+    older_messages = transcript_store.count(session_id) - window_size
+    if older_messages > 0:
+        if st.button(f"Load earlier messages ({older_messages} more)", key="chat_load_earlier"):
+            st.session_state.chat_window_size = window_size + TRANSCRIPT_PAGE
+            st.rerun()
     
-    st.markdown('</div>', unsafe_allow_html=True)
+    visible_messages = transcript_store.window(session_id, window_size)
+    st.markdown('<div class="chat-container">' + "".join(render_message_html(msg) for msg in visible_messages)
+                + '</div>', unsafe_allow_html=True)
     
     st.markdown('<div class="chat-input-container">', unsafe_allow_html=True)
     col1, col2 = st.columns([4, 1])
@@ -2970,30 +5474,30 @@ def show_chat_interface():
     st.markdown('</div>', unsafe_allow_html=True)
     
     if send_button and user_input.strip():
-        add_message("user", user_input.strip())
-        st.session_state.ai_thinking = True
-        st.rerun()
-    
-    if st.session_state.ai_thinking:
-        last_user_message = st.session_state.chat_messages[-1]['content']
-        
-        time.sleep(1)
-        
-        ai_response = ai_assistant.process_complex_query(last_user_message)
+        pending_query = user_input.strip()
+    
+    # Answer in this same run - the reply streams in while a background worker computes it
+    if pending_query:
+        add_message("user", pending_query)
+        with st.chat_message("user"):
+            st.markdown(pending_query)
+        with st.chat_message("assistant"):
+            outcome = {}
+            streamed = st.write_stream(stream_assistant_response(ai_assistant, pending_query, outcome))
+        ai_response = (streamed if isinstance(streamed, str) else "".join(map(str, streamed))).replace("  \n", "\n").strip()
         add_message("ai", ai_response)
         
-        ai_assistant.learn_from_interaction(last_user_message, ai_response, was_helpful=True)
-        
-        st.session_state.ai_thinking = False
-        st.rerun()
+        ai_assistant.learn_from_interaction(pending_query, ai_response, outcome.get('route'), was_helpful=True)
     
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Clear Chat History", use_container_width=True):
-            st.session_state.chat_messages = []
+            get_transcript_store().clear(st.session_state.chat_session_id)
+            st.session_state.chat_window_size = None
             st.rerun()
     with col2:
         if st.button("Reload AI Models", use_container_width=True):
+            get_fastener_ai.clear()
             st.session_state.ai_model_loaded = False
             st.rerun()
 
@@ -3059,20 +5563,17 @@ def enhanced_export_data(filtered_df, export_format):
 # ======================================================
 def save_calculation_history(calculation_data):
     """Save calculation to history"""
-    if 'calculation_history' not in st.session_state:
-        st.session_state.calculation_history = []
+    if not isinstance(st.session_state.get('calculation_history'), CalculationHistory):
+        st.session_state.calculation_history = CalculationHistory()
     
     calculation_data['timestamp'] = datetime.now().isoformat()
     st.session_state.calculation_history.append(calculation_data)
-    
-    if len(st.session_state.calculation_history) > 20:
-        st.session_state.calculation_history = st.session_state.calculation_history[-20:]
 
 def show_calculation_history():
     """Display calculation history"""
     if 'calculation_history' in st.session_state and st.session_state.calculation_history:
         st.markdown("### Recent Calculations")
-        for calc in reversed(st.session_state.calculation_history[-5:]):
+        for calc in st.session_state.calculation_history.recent(5):
             with st.container():
                 st.markdown(f"""
                 <div class="calculation-card">
@@ -3388,6 +5889,19 @@ def show_section_a_results():
     
     # NEW: Professional Card View Toggle
     col1, col2 = st.columns([3, 1])
+    with col1:
+        # Display unit toggle - converts the whole result table in one vectorized pass
+        display_unit = st.radio(
+            "Display Units",
+            ["Native", "mm", "inch"],
+            horizontal=True,
+            key="section_a_display_unit"
+        )
+        selected_standard = st.session_state.section_a_filters.get('standard', 'All')
+        native_unit = SERIES_UNITS.get(st.session_state.available_series.get(selected_standard, ""), 'mm')
+        if display_unit != "Native":
+            result_df = convert_dataframe_units(result_df, native_unit, display_unit)
+        st.caption(f"Dimensions shown in {native_unit if display_unit == 'Native' else display_unit}")
     with col2:
         show_card_view = st.checkbox("Show Professional Card View", value=st.session_state.show_professional_card, key="card_view_toggle")
         st.session_state.show_professional_card = show_card_view
@@ -3496,88 +6010,21 @@ def apply_section_c_filters():
     if df_mechem.empty:
         return pd.DataFrame()
     
-    result_df = df_mechem.copy()
-    
-    # Find ALL possible property class columns
-    property_class_cols = []
-    possible_class_cols = ['Grade', 'Class', 'Property Class', 'Material Grade', 'Type', 'Designation', 'Material']
-    
-    for col in df_mechem.columns:
-        col_lower = str(col).lower()
-        for possible in possible_class_cols:
-            if possible.lower() in col_lower:
-                property_class_cols.append(col)
-                break
-    
-    # If no specific class columns found, use first few columns
-    if not property_class_cols:
-        for col in df_mechem.columns[:3]:
-            if df_mechem[col].dtype == 'object':
-                property_class_cols.append(col)
-                break
-    
-    # Apply property class filter using ALL possible columns
-    filtered_data = pd.DataFrame()
-    
-    for prop_col in property_class_cols:
-        if prop_col in result_df.columns:
-            # Try exact match first
-            exact_match = result_df[result_df[prop_col] == property_class]
-            if not exact_match.empty:
-                filtered_data = exact_match
-                break
-            # Try string contains for more flexible matching
-            str_match = result_df[result_df[prop_col].astype(str).str.contains(str(property_class), na=False, case=False)]
-            if not str_match.empty:
-                filtered_data = str_match
-                break
+    # Class and standard filters resolve to row positions through the index - no per-column scans or copies
+    row_index = get_grade_knowledge(catalog_version)
+    positions = row_index.class_rows(property_class)
     
     # If no match found with property class, return empty
-    if filtered_data.empty:
+    if not positions.size:
         return pd.DataFrame()
     
-    result_df = filtered_data
-    
-    # Apply standard filter if specified
+    # Apply standard filter if specified - an unmatched standard leaves the class rows as they are
     if standard != "All":
-        # Find ALL possible standard columns
-        standard_cols = []
-        possible_standard_cols = ['Standard', 'Specification', 'Norm', 'Type', 'Designation']
-        
-        for col in result_df.columns:
-            col_lower = str(col).lower()
-            for possible in possible_standard_cols:
-                if possible.lower() in col_lower:
-                    standard_cols.append(col)
-                    break
-        
-        # If no standard columns found, look for columns containing standard-like data
-        if not standard_cols:
-            for col in result_df.columns:
-                if any(word in col.lower() for word in ['iso', 'astm', 'asme', 'din', 'bs', 'jis', 'gb']):
-                    standard_cols.append(col)
-                    break
-        
-        # Apply standard filter using ALL possible columns
-        standard_filtered = pd.DataFrame()
-        
-        for std_col in standard_cols:
-            if std_col in result_df.columns:
-                # Try exact match
-                exact_std_match = result_df[result_df[std_col] == standard]
-                if not exact_std_match.empty:
-                    standard_filtered = exact_std_match
-                    break
-                # Try string contains
-                str_std_match = result_df[result_df[std_col].astype(str).str.contains(str(standard), na=False, case=False)]
-                if not str_std_match.empty:
-                    standard_filtered = str_std_match
-                    break
-        
-        if not standard_filtered.empty:
-            result_df = standard_filtered
+        standard_positions = row_index.standard_rows(standard, within=positions)
+        if standard_positions.size:
+            positions = standard_positions
     
-    return result_df
+    return df_mechem.iloc[positions]
 
 def show_section_c_results():
     """Display results for Section C - COMPLETELY FIXED"""
@@ -4081,6 +6528,28 @@ def show_enhanced_product_database():
                     
                     st.rerun()
         
+        with st.expander("Search by property range"):
+            st.caption("Conditions on guaranteed limits, e.g. tensile >= 830 MPa and C <= 0.4% - "
+                       "ksi and psi are converted to MPa")
+            range_query = st.text_input("Property range query", key="section_c_range_query",
+                                        placeholder="tensile >= 830 MPa and C <= 0.4%")
+            if st.button("Search Property Ranges", use_container_width=True, key="section_c_range_search"):
+                conditions, positions, unrecognized = get_property_store(catalog_version).query(range_query)
+                if conditions and unrecognized:
+                    # Applying the rest silently would widen the result - ask for a corrected query instead
+                    st.warning(f"No known property in: {'; '.join(unrecognized)} - "
+                               "use e.g. 'tensile >= 830 MPa' or 'C% <= 0.4'")
+                elif not conditions:
+                    st.warning("No property conditions recognized - use e.g. 'yield >= 640 MPa' or 'Mn <= 1%'")
+                else:
+                    st.session_state.section_c_filters = {'property_range': range_query}
+                    st.session_state.section_c_results = df_mechem.iloc[positions]
+                    if st.session_state.section_c_results.empty:
+                        # No rerun - the warning would be cleared before it is seen
+                        st.warning(f"No rows satisfy {range_query}")
+                    else:
+                        st.rerun()
+        
         st.markdown("</div>", unsafe_allow_html=True)
         
         # Show Section C Results